@@ -0,0 +1,301 @@
+"""Offline micro-benchmarks of the game's hot functions.
+
+Every case runs against local bit sources at realistic scales and the results go
+to JSON. With --compare, the run is checked against a stored baseline and the
+command exits with status 1 when a case got slower than the allowed ratio.
+
+The startup cases time a fresh interpreter importing the app and rendering its
+first page with Streamlit's AppTest; they also fail the run when the import
+loads one of HEAVY_MODULES, which should only load on first use.
+
+    python benchmarks.py --out bench.json
+    python benchmarks.py --compare bench.json --threshold 1.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from bit_sources import PackedBitLog, random_packed_slots
+from race_engine import LaneRace, LevelPercentiles, count_ones_packed, entropy_table, lane_targets
+from race_export import TickLog, export_race
+
+TICK_SCALES = (1_000, 10_000, 100_000)
+SLOT_SIZES = (1_000, 10_000, 100_000)
+LANE_COUNTS = (2, 4, 8)
+SEED = 12345
+APP_FILE = "mind_battle_car_game_streamlit2.py"
+HEAVY_MODULES = ("pandas", "gspread", "oauth2client", "rdoclient", "PIL", "pyarrow", "xlsxwriter")
+STARTUP_CASES = ("app_import", "first_render")
+
+IMPORT_SCRIPT = f"""
+import json, sys
+import {APP_FILE[:-3]}
+print(json.dumps({{"heavy_modules": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+FIRST_RENDER_SCRIPT = f"""
+import json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({APP_FILE!r}, default_timeout=60)
+at.secrets["google_sheets"] = {{"credentials_json": "{{}}"}}
+at.run()
+print(json.dumps({{"exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def _app():
+    """The Streamlit app module, for the helpers that live there."""
+    import mind_battle_car_game_streamlit2
+
+    return mind_battle_car_game_streamlit2
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """Time fn() like timeit: calibrate a loop count, then return per-call seconds of each repeat."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(int(min_time / elapsed) + 1, 10))
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+def _run_script(script):
+    """Run script in a fresh interpreter from this directory and return its JSON output."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-c", script], cwd=here, capture_output=True, text=True)
+    if proc.returncode:
+        error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        if error.startswith(("ModuleNotFoundError", "ImportError")):
+            raise ImportError(error)
+        raise RuntimeError(error)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(script):
+    """Cold start: a whole new process, as a fresh container pays it. The first run's output is kept as info."""
+    info = _run_script(script)
+
+    def fn():
+        _run_script(script)
+
+    fn.info = info
+    return fn
+
+
+def bench_random_packed_slots(slot_size, n_lanes=2):
+    """Local bits of one tick: a packed slot per lane."""
+    rng = np.random.default_rng(SEED)
+    return lambda: random_packed_slots(rng, n_lanes, slot_size)
+
+
+def bench_count_ones_packed(slot_size, n_lanes=2):
+    slots = random_packed_slots(np.random.default_rng(SEED), n_lanes, slot_size)
+    return lambda: count_ones_packed(slots)
+
+
+def bench_level_percentiles(ticks, n_lanes=2, slot_size=1000):
+    """Thresholds of a whole race: one add and one value per tick for every lane."""
+    table = entropy_table(slot_size)
+    levels = np.unique(table)
+    indexes = np.searchsorted(levels, table)[np.random.default_rng(SEED).binomial(slot_size, 0.5, (ticks, n_lanes))]
+
+    def race():
+        percentiles = LevelPercentiles(levels, n_lanes, 5)
+        for index in indexes:
+            percentiles.add(index)
+            percentiles.value()
+    return race
+
+
+def bench_lane_race(ticks, n_lanes=2, slot_size=1000):
+    """Every LaneRace.tick of a whole race from counts of ones, without generating bits."""
+    ones = np.random.default_rng(SEED).binomial(slot_size, 0.5, (ticks, n_lanes))
+
+    def race():
+        lane_race = LaneRace(lane_targets(1, n_lanes), slot_size, track_end=np.inf)  # Never finishes early
+        for tick_ones in ones:
+            lane_race.tick(tick_ones)
+    return race
+
+
+def bench_image_to_base64():
+    from PIL import Image
+
+    app = _app()
+    image = Image.open(os.path.join(app.IMAGE_DIR, "car.png")).resize(app.CAR_SIZE)
+    return lambda: app.image_to_base64(image)
+
+
+def bench_car_html(ticks):
+    app = _app()
+    image = "A" * 40_000  # Size of a base64-encoded 150×150 car
+    positions = np.linspace(50, 900, ticks).tolist()
+
+    def race():
+        for pos in positions:
+            app.lane_html("lane-1", image, image, image, True, first=True)
+            app.positions_css((pos, pos))
+    return race
+
+
+def recorded_race(ticks, slot_size=1000, n_lanes=2):
+    """Bits and tick log of a race of the given length, from a local generator."""
+    rng = np.random.default_rng(SEED)
+    lane_bits, tick_log = [PackedBitLog() for _ in range(n_lanes)], TickLog(n_lanes)
+    for _ in range(ticks):
+        for bits in lane_bits:
+            bits.append(rng.integers(0, 2, size=slot_size, dtype=np.uint8))
+        tick_log.append(entropy=np.full(n_lanes, 0.999), threshold=np.full(n_lanes, 0.998))
+    return lane_bits, tick_log
+
+
+def bench_excel_export(ticks):
+    lane_bits, tick_log = recorded_race(ticks)
+
+    def export():
+        with tempfile.TemporaryFile() as f:
+            export_race(f, "xlsx", lane_bits, tick_log, 1)
+    return export
+
+
+def bench_lane_tick(n_lanes, slot_size):
+    """One tick of an n_lanes race: packed bits for all lanes, ones, entropy, threshold and movement."""
+    rng = np.random.default_rng(SEED)
+    race = LaneRace(lane_targets(1, n_lanes), slot_size)
+    for _ in range(100):  # A realistic entropy history
+        race.tick(count_ones_packed(random_packed_slots(rng, n_lanes, slot_size)))
+    race.track_end = np.inf  # Keep racing however long the measurement runs
+
+    def tick():
+        race.tick(count_ones_packed(random_packed_slots(rng, n_lanes, slot_size)))
+    return tick
+
+
+def cases(max_ticks, max_slot):
+    """(name, params, factory) for every benchmark at every scale."""
+    yield "app_import", {}, lambda: bench_startup(IMPORT_SCRIPT)
+    yield "first_render", {}, lambda: bench_startup(FIRST_RENDER_SCRIPT)
+    ticks = [t for t in TICK_SCALES if t <= max_ticks]
+    slots = [s for s in SLOT_SIZES if s <= max_slot]
+    for s in slots:
+        yield "random_packed_slots", {"slot_size": s}, lambda s=s: bench_random_packed_slots(s)
+        yield "count_ones_packed", {"slot_size": s}, lambda s=s: bench_count_ones_packed(s)
+        for n in LANE_COUNTS:
+            yield "lane_tick", {"lanes": n, "slot_size": s}, lambda n=n, s=s: bench_lane_tick(n, s)
+    for t in ticks:
+        yield "level_percentiles", {"ticks": t}, lambda t=t: bench_level_percentiles(t)
+        yield "lane_race", {"ticks": t}, lambda t=t: bench_lane_race(t)
+        yield "car_html", {"ticks": t}, lambda t=t: bench_car_html(t)
+    yield "image_to_base64", {}, bench_image_to_base64
+    for t in ticks:
+        yield "excel_export", {"ticks": t}, lambda t=t: bench_excel_export(t)
+
+
+def case_key(name, params):
+    return name + "".join(f"[{k}={v}]" for k, v in params.items())
+
+
+def run(max_ticks, max_slot, repeat, only=None):
+    results = {}
+    for name, params, factory in cases(max_ticks, max_slot):
+        if only and name not in only:
+            continue
+        key = case_key(name, params)
+        try:
+            fn = factory()
+        except ImportError as e:
+            results[key] = {"name": name, "params": params, "skipped": str(e)}
+            print(f"{key:50} skipped: {e}")
+            continue
+        # Whole-race and startup cases are slow enough that one call per repeat is plenty
+        slow = "ticks" in params or name in STARTUP_CASES
+        samples = measure(fn, repeat=min(repeat, 3) if slow else repeat, min_time=0 if slow else 0.2)
+        result = {
+            "name": name,
+            "params": params,
+            "min_s": min(samples),
+            "median_s": statistics.median(samples),
+            "samples_s": samples,
+        }
+        result.update(getattr(fn, "info", {}))
+        if "ticks" in params:
+            result["per_tick_us"] = result["median_s"] / params["ticks"] * 1e6
+        results[key] = result
+        print(f"{key:50} {result['median_s'] * 1e3:12.4f} ms")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Cases whose median got slower than threshold × the baseline median."""
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get("results", {}).get(key)
+        if not old or "median_s" not in old or "median_s" not in result:
+            continue
+        ratio = result["median_s"] / old["median_s"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{key:50} {ratio:6.2f}x {flag}")
+        if ratio > threshold:
+            regressions.append((key, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression")
+    parser.add_argument("--max-ticks", type=int, default=max(TICK_SCALES))
+    parser.add_argument("--max-slot", type=int, default=max(SLOT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    args = parser.parse_args(argv)
+
+    results = run(args.max_ticks, args.max_slot, args.repeat, args.only)
+    status = 0
+    heavy = results.get("app_import", {}).get("heavy_modules")
+    if heavy:
+        print(f"importing the app loads {', '.join(heavy)}; defer them to first use")
+        status = 1
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "seed": SEED,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold}x")
+            return 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+import base64
+import threading
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+
+_root_seed = np.random.SeedSequence()
+_root_seed_lock = threading.Lock()
+
+
+def spawn_local_generator():
+    """Return a new numpy Generator on an independent stream spawned from the process seed."""
+    with _root_seed_lock:
+        child = _root_seed.spawn(1)[0]
+    return np.random.Generator(np.random.PCG64(child))
+
+
+def packed_size(num_bits):
+    """Bytes needed to hold num_bits bits packed with np.packbits."""
+    return (num_bits + 7) // 8
+
+
+def mask_padding(slots, slot_size):
+    """Zero the padding bits at the end of every row of (slots × row_bytes) packed bits, in place."""
+    if slot_size % 8:
+        slots[:, -1] &= 0xFF << (8 - slot_size % 8) & 0xFF
+    return slots
+
+
+def random_packed_slots(rng, n_slots, slot_size):
+    """n_slots slots of slot_size fair random bits as one (n_slots × row_bytes) packed array."""
+    slots = rng.integers(0, 256, size=(n_slots, packed_size(slot_size)), dtype=np.uint8)
+    return mask_padding(slots, slot_size)
+
+
+def get_random_packed_slots(n_slots, slot_size, pool=None, rng=None):
+    """n_slots packed slots from the pool when it can cover them, else from a local generator.
+
+    Never waits for the network. Returns (packed, from_pool).
+    """
+    if pool and not pool.breaker.is_open:
+        packed = pool.take_packed_slots(n_slots, slot_size)
+        if packed is not None:
+            return packed, True
+    # Pool not configured, empty or circuit breaker open: use a local pseudorandom generator
+    if rng is None:
+        rng = np.random.default_rng()
+    return random_packed_slots(rng, n_slots, slot_size), False
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for a cooldown after repeated consecutive failures."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=3, cooldown=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Current state: closed, open, or half-open once the cooldown has expired."""
+        with self._lock:
+            if self.opened_at is None:
+                return self.CLOSED
+            if self.clock() - self.opened_at < self.cooldown:
+                return self.OPEN
+            return self.HALF_OPEN
+
+    @property
+    def is_open(self):
+        return self.state == self.OPEN
+
+    def remaining_cooldown(self):
+        """Seconds left before a trial request is allowed again."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(self.cooldown - (self.clock() - self.opened_at), 0.0)
+
+    def allow_request(self):
+        """Whether a call to the protected service may be attempted now."""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                # A failed trial request in half-open state reopens for a full cooldown
+                self.opened_at = self.clock()
+
+
+class PackedBitPool(ABC):
+    """Ring buffer of packed bits filled by one background worker and read by the tick loop.
+
+    Subclasses implement _fill, which fetches the bits and calls _put; capacity is
+    in bits and is rounded up to whole bytes.
+    """
+
+    def __init__(self, capacity, breaker=None):
+        self.breaker = breaker or CircuitBreaker()
+        self.capacity = packed_size(capacity)  # In bytes
+        self._buffer = np.zeros(self.capacity, dtype=np.uint8)
+        self._start = 0  # Index of the oldest unread byte
+        self._size = 0  # Number of unread bytes in the buffer
+        self._lock = threading.Lock()
+        self._space_available = threading.Condition(self._lock)
+        self._closed = False
+        self.underruns = 0
+        self.fetched_bits = 0
+        self.fetch_errors = 0
+        self.last_error = None
+        self._worker = None
+
+    def grow(self, capacity):
+        """Enlarge the buffer to hold at least capacity bits, keeping the unread ones in order."""
+        capacity = packed_size(capacity)
+        with self._lock:
+            if capacity <= self.capacity:
+                return
+            buffer = np.zeros(capacity, dtype=np.uint8)
+            first = min(self._size, self.capacity - self._start)
+            buffer[:first] = self._buffer[self._start:self._start + first]
+            buffer[first:self._size] = self._buffer[:self._size - first]
+            self._buffer, self.capacity, self._start = buffer, capacity, 0
+            self._space_available.notify()
+
+    def _start_worker(self, name):
+        self._worker = threading.Thread(target=self._fill, name=name, daemon=True)
+        self._worker.start()
+
+    @abstractmethod
+    def _fill(self):
+        """Worker loop: fetch bits and _put them until the pool is closed."""
+
+    @property
+    def available(self):
+        """Number of bits ready to be handed out."""
+        with self._lock:
+            return 8 * self._size
+
+    def take_packed(self, num_bits):
+        """Return num_bits bits packed like np.packbits, or None if the buffer cannot cover them yet.
+
+        Whole bytes are consumed; padding bits in the last byte are zeroed.
+        """
+        num_bytes = packed_size(num_bits)
+        with self._lock:
+            if self._size < num_bytes:
+                self.underruns += 1
+                return None
+            first = min(num_bytes, self.capacity - self._start)
+            packed = np.empty(num_bytes, dtype=np.uint8)
+            packed[:first] = self._buffer[self._start:self._start + first]
+            packed[first:] = self._buffer[:num_bytes - first]
+            self._start = (self._start + num_bytes) % self.capacity
+            self._size -= num_bytes
+            self._space_available.notify()
+        if num_bits % 8:
+            packed[-1] &= 0xFF << (8 - num_bits % 8) & 0xFF
+        return packed
+
+    def take_packed_slots(self, n_slots, slot_size):
+        """Return n_slots packed slots as one (n_slots × row_bytes) array taken in a single read, or None."""
+        row_bytes = packed_size(slot_size)
+        packed = self.take_packed(8 * n_slots * row_bytes)
+        if packed is None:
+            return None
+        return mask_padding(packed.reshape(n_slots, row_bytes), slot_size)
+
+    def close(self):
+        """Stop the background worker."""
+        with self._lock:
+            self._closed = True
+            self._space_available.notify_all()
+
+    def _put(self, packed):
+        """Append fetched bytes at the end of the ring buffer (caller holds the lock)."""
+        end = (self._start + self._size) % self.capacity
+        first = min(len(packed), self.capacity - end)
+        self._buffer[end:end + first] = packed[:first]
+        self._buffer[:len(packed) - first] = packed[first:]
+        self._size += len(packed)
+
+
+class RandomOrgBitPool(PackedBitPool):
+    """Process-wide ring buffer of random.org bits kept full by one background worker.
+
+    Bits are stored packed, eight per byte. With blobs=True they are fetched as
+    base64 blobs, which carry far more bits per request than lists of integers.
+    batch_size and capacity are in bits and are rounded up to whole bytes.
+    """
+
+    def __init__(self, client, batch_size=1000, capacity=None, retry_delay=1.0, breaker=None, blobs=False):
+        batch_bytes = packed_size(batch_size)
+        super().__init__(capacity or 16 * 8 * batch_bytes, breaker)
+        self.client = client
+        self.blobs = blobs
+        self.batch_bytes = batch_bytes
+        self.batch_size = 8 * batch_bytes
+        self.retry_delay = retry_delay
+        self._start_worker("random-org-bit-pool")
+
+    def grow(self, capacity, batch_size=None):
+        """Enlarge the buffer, and the batches up to batch_size bits, for a larger race."""
+        super().grow(capacity)
+        batch_bytes = packed_size(batch_size or 0)
+        with self._lock:
+            if batch_bytes > self.batch_bytes:
+                self.batch_bytes = min(batch_bytes, self.capacity)
+                self.batch_size = 8 * self.batch_bytes
+
+    def _fetch(self):
+        """One batch of random.org bits, packed."""
+        if self.blobs:
+            blob = self.client.generate_blobs(1, self.batch_size, format="base64")[0]
+            return np.frombuffer(base64.b64decode(blob), dtype=np.uint8)
+        bits = np.asarray(self.client.generate_integers(self.batch_size, 0, 1), dtype=np.uint8)
+        return np.packbits(bits)
+
+    def _fill(self):
+        """Keep the buffer topped up with batches of at most batch_size bits."""
+        while True:
+            with self._lock:
+                while not self._closed and self.capacity - self._size < self.batch_bytes:
+                    self._space_available.wait()
+                if self._closed:
+                    return
+            if not self.breaker.allow_request():
+                time.sleep(min(self.breaker.remaining_cooldown(), self.retry_delay))
+                continue
+            try:
+                packed = self._fetch()
+            except Exception as e:
+                self.fetch_errors += 1
+                self.last_error = e
+                self.breaker.record_failure()
+                time.sleep(self.retry_delay)
+                continue
+            self.breaker.record_success()
+            with self._lock:
+                self._put(packed)
+                self.fetched_bits += 8 * len(packed)
+
+
+class SerialBitPool(PackedBitPool):
+    """Bits streamed by a hardware random number generator on a serial port.
+
+    A reader thread does large reads of whatever the device has sent and appends
+    the bytes to the ring buffer; the tick loop takes whole packed slots from it.
+    The device keeps streaming whether or not the game reads, so when the buffer
+    is full the oldest bytes are dropped and the slots handed out stay fresh.
+    Failures to open or read the port go through the circuit breaker, and the
+    port is reopened after each one.
+    """
+
+    def __init__(self, port, baudrate=115200, capacity=1 << 23, read_size=1 << 16, read_timeout=0.05,
+                 reconnect_delay=1.0, breaker=None, open_port=None, clock=time.monotonic):
+        super().__init__(capacity, breaker)
+        self.port = port
+        self.baudrate = baudrate
+        self.read_size = read_size  # Largest single read, in bytes
+        self.read_timeout = read_timeout
+        self.reconnect_delay = reconnect_delay
+        self.open_port = open_port or self._open_serial
+        self.clock = clock
+        self.dropped_bits = 0
+        self.started_at = None  # Time of the first byte received
+        self._serial = None
+        self._start_worker("serial-bit-pool")
+
+    def _open_serial(self):
+        import serial  # pyserial, only needed when a hardware generator is used
+
+        return serial.Serial(self.port, self.baudrate, timeout=self.read_timeout)
+
+    def throughput(self):
+        """Sustained bits per second received since the first byte."""
+        if self.started_at is None:
+            return 0.0
+        elapsed = self.clock() - self.started_at
+        return self.fetched_bits / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            "fetched_bits": self.fetched_bits,
+            "throughput_bps": self.throughput(),
+            "underruns": self.underruns,
+            "dropped_bits": self.dropped_bits,
+            "fetch_errors": self.fetch_errors,
+            "available_bits": self.available,
+        }
+
+    def close(self):
+        super().close()
+        if self._worker is not None:
+            self._worker.join(timeout=2 * self.read_timeout + 1)
+        self._disconnect()
+
+    def _disconnect(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+
+    def _put_latest(self, data):
+        """Append data, dropping the oldest unread bytes if it does not fit (caller holds the lock)."""
+        data = data[-self.capacity:]
+        excess = self._size + len(data) - self.capacity
+        if excess > 0:
+            self._start = (self._start + excess) % self.capacity
+            self._size -= excess
+            self.dropped_bits += 8 * excess
+        self._put(data)
+
+    def _fill(self):
+        """Read the port in large chunks until the pool is closed."""
+        while not self._closed:
+            if self._serial is None:
+                if not self.breaker.allow_request():
+                    time.sleep(min(self.breaker.remaining_cooldown(), self.reconnect_delay))
+                    continue
+                try:
+                    self._serial = self.open_port()
+                except Exception as e:
+                    self._failed(e)
+                    continue
+            try:
+                # Returns after read_size bytes or read_timeout, whichever comes first
+                data = self._serial.read(self.read_size)
+            except Exception as e:
+                self._failed(e)
+                continue
+            if not data:
+                continue
+            self.breaker.record_success()
+            with self._lock:
+                if self.started_at is None:
+                    self.started_at = self.clock()
+                self._put_latest(np.frombuffer(data, dtype=np.uint8))
+                self.fetched_bits += 8 * len(data)
+
+    def _failed(self, error):
+        self.fetch_errors += 1
+        self.last_error = error
+        self.breaker.record_failure()
+        self._disconnect()
+        time.sleep(self.reconnect_delay)
+
+
+class PackedBitLog:
+    """Growable record of fixed-size slots of bits, stored with np.packbits.
+
+    Each slot of slot_size bits takes ceil(slot_size / 8) bytes, and the number
+    of ones and zeros is counted once when the slot is appended.
+    """
+
+    def __init__(self, initial_slots=64):
+        self.slot_size = None
+        self.row_bytes = 0
+        self._initial_slots = initial_slots
+        self._buffer = np.empty(0, dtype=np.uint8)
+        self.slots = 0
+        self.ones = 0
+        self.zeros = 0
+
+    def __len__(self):
+        return self.slots
+
+    @property
+    def nbytes(self):
+        """Bytes used by the recorded bits."""
+        return self.slots * self.row_bytes
+
+    def append(self, bits):
+        """Record one slot of 0/1 values."""
+        bits = np.asarray(bits, dtype=np.uint8)
+        ones = int(np.count_nonzero(bits))
+        self.append_packed(np.packbits(bits), len(bits), ones)
+
+    def append_packed(self, packed, slot_size, ones):
+        """Record one slot already packed with np.packbits, with its number of ones."""
+        if self.slot_size is None:
+            self.slot_size = slot_size
+            self.row_bytes = packed_size(slot_size)
+            self._buffer = np.empty(self._initial_slots * self.row_bytes, dtype=np.uint8)
+        elif slot_size != self.slot_size:
+            raise ValueError(f"expected {self.slot_size} bits, got {slot_size}")
+        end = self.nbytes + self.row_bytes
+        if end > len(self._buffer):
+            # Double the capacity so appends stay amortized O(1)
+            grown = np.empty(max(2 * len(self._buffer), end), dtype=np.uint8)
+            grown[:self.nbytes] = self._buffer[:self.nbytes]
+            self._buffer = grown
+        self._buffer[self.nbytes:end] = packed
+        self.ones += ones
+        self.zeros += self.slot_size - ones
+        self.slots += 1
+
+    def packed(self):
+        """Recorded slots as a (slots × row_bytes) packed uint8 array, without copying."""
+        return self._buffer[:self.nbytes].reshape(self.slots, self.row_bytes)
+
+    def unpack(self, start=0, stop=None):
+        """Slots start:stop as a (slots × slot_size) uint8 array of 0/1 values."""
+        if self.slot_size is None:
+            return np.empty((0, 0), dtype=np.uint8)
+        return np.unpackbits(self.packed()[start:stop], axis=1, count=self.slot_size)
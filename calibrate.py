@@ -0,0 +1,124 @@
+"""Monte Carlo calibration of move_multiplier and track length under the null hypothesis.
+
+Simulates many races with fair random bits and the game's exact movement rules,
+spreading the work over all cores, and reports how long races last, how often
+each car moves and how often the green car wins for every setting.
+
+    python calibrate.py --races 1000000 --multipliers 10 20 50 100 --out calibration.npz
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from race_engine import TRACK_END, simulate_null_races
+
+TICK_INTERVAL = 0.5  # Seconds per tick in the interactive game
+
+
+def run_chunk(n_races, move_multiplier, track_end, seed, options):
+    """Simulate one chunk of races on its own random stream."""
+    rng = np.random.Generator(np.random.PCG64(seed))
+    return simulate_null_races(n_races, move_multiplier, rng, track_end=track_end, **options)
+
+
+def calibrate(n_races, multipliers, track_ends, chunk_size=10_000, workers=None, seed=None, **options):
+    """Simulate n_races races for every (multiplier, track end) pair.
+
+    Returns a dict keyed by (multiplier, track_end) of concatenated per-race arrays.
+    Every chunk gets an independent SeedSequence child, so results do not depend on
+    how the chunks are scheduled across processes.
+    """
+    settings = [(m, t) for m in multipliers for t in track_ends]
+    sizes = [min(chunk_size, n_races - start) for start in range(0, n_races, chunk_size)]
+    seeds = iter(np.random.SeedSequence(seed).spawn(len(settings) * len(sizes)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            setting: [pool.submit(run_chunk, size, *setting, next(seeds), options) for size in sizes]
+            for setting in settings
+        }
+        results = {}
+        for setting, chunks in futures.items():
+            parts = [f.result() for f in chunks]
+            results[setting] = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    return results
+
+
+def summarize(results, tick_interval=TICK_INTERVAL):
+    """One row of summary statistics per (multiplier, track end) pair."""
+    rows = []
+    for (multiplier, track_end), r in results.items():
+        done = r["finished"]
+        ticks = r["ticks"][done] if done.any() else np.zeros(1)
+        rows.append((
+            multiplier, track_end, len(done), done.mean(),
+            r["green_won"][done].mean() if done.any() else np.nan,
+            ticks.mean() * tick_interval,
+            *(np.percentile(ticks, [5, 50, 95]) * tick_interval),
+            r["car1_moves"].mean(), r["car2_moves"].mean(),
+        ))
+    return np.array(rows, dtype=[
+        ("multiplier", "f8"), ("track_end", "f8"), ("races", "i8"), ("finished", "f8"),
+        ("green_win_rate", "f8"), ("mean_seconds", "f8"), ("p5_seconds", "f8"),
+        ("median_seconds", "f8"), ("p95_seconds", "f8"),
+        ("red_moves", "f8"), ("green_moves", "f8"),
+    ])
+
+
+def save_results(path, results, summary):
+    """Write the summary table and per-race arrays to one .npz file.
+
+    Arrays prefixed with i belong to row i of the summary; outcome is 0 for an
+    unfinished race, 1 when green won and 2 when red won.
+    """
+    arrays = {"summary": summary}
+    for i, r in enumerate(results.values()):
+        arrays[f"{i}_ticks"] = r["ticks"]
+        arrays[f"{i}_car1_moves"] = r["car1_moves"].astype(np.uint16)
+        arrays[f"{i}_car2_moves"] = r["car2_moves"].astype(np.uint16)
+        arrays[f"{i}_outcome"] = np.where(r["finished"], np.where(r["green_won"], 1, 2), 0).astype(np.uint8)
+    np.savez_compressed(path, **arrays)
+
+
+def print_summary(summary):
+    """Print the summary table, one line per setting."""
+    print(f"{'mult':>6} {'track':>6} {'races':>9} {'done':>6} {'green':>6} "
+          f"{'mean s':>8} {'p5 s':>8} {'med s':>8} {'p95 s':>8} {'red mv':>7} {'green mv':>8}")
+    for row in summary:
+        print(f"{row['multiplier']:6g} {row['track_end']:6g} {row['races']:9d} {row['finished']:6.1%} "
+              f"{row['green_win_rate']:6.1%} {row['mean_seconds']:8.1f} {row['p5_seconds']:8.1f} "
+              f"{row['median_seconds']:8.1f} {row['p95_seconds']:8.1f} "
+              f"{row['red_moves']:7.1f} {row['green_moves']:8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--races", type=int, default=100_000, help="races per setting")
+    parser.add_argument("--multipliers", type=float, nargs="+", default=[10, 20, 50, 100])
+    parser.add_argument("--track-end", type=float, nargs="+", default=[TRACK_END],
+                        help="finishing position(s); cars start at 50")
+    parser.add_argument("--slot-size", type=int, default=1000, help="bits per slot")
+    parser.add_argument("--exact-threshold", action="store_true",
+                        help="use the binomial 5th percentile instead of the running one")
+    parser.add_argument("--max-ticks", type=int, default=100_000,
+                        help="races still running after this many ticks count as unfinished")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="races per worker task")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default="calibration.npz", help="results file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = calibrate(
+        args.races, args.multipliers, args.track_end, chunk_size=args.chunk_size,
+        workers=args.workers, seed=args.seed, slot_size=args.slot_size,
+        exact_threshold=args.exact_threshold, max_ticks=args.max_ticks,
+    )
+    summary = summarize(results)
+    save_results(args.out, results, summary)
+    print_summary(summary)
+    print(f"{len(results) * args.races} races in {time.perf_counter() - start:.1f} s, saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
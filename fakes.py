@@ -0,0 +1,73 @@
+"""Local stand-ins for random.org and a Google Sheets worksheet, for load tests without network or quota."""
+import base64
+import random
+import threading
+import time
+import numpy as np
+from bit_sources import packed_size, spawn_local_generator
+
+
+class FakeRandomOrgClient:
+    """Stand-in for rdoclient.RandomOrgClient that draws from a local generator.
+
+    Every call sleeps latency seconds, then fails with probability failure_rate.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, rng=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = rng or spawn_local_generator()
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.failure_rate and self.rng.random() < self.failure_rate:
+                self.failures += 1
+                raise ConnectionError("simulated random.org error")
+
+    def generate_integers(self, n, min, max):
+        self._call()
+        with self._lock:
+            return self.rng.integers(min, max + 1, size=n).tolist()
+
+    def generate_blobs(self, n, size, format="base64"):
+        self._call()
+        with self._lock:
+            blobs = [self.rng.integers(0, 256, size=packed_size(size), dtype=np.uint8).tobytes() for _ in range(n)]
+        return [base64.b64encode(blob).decode() for blob in blobs]
+
+
+class FakeWorksheet:
+    """In-memory stand-in for a gspread worksheet."""
+
+    def __init__(self, latency=0.0, fail_times=0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.fail_times = fail_times  # Number of upcoming calls that raise
+        self.failure_rate = failure_rate  # Chance that any other call raises
+        self.offline = False
+        self._random = random.Random(seed)
+        self.rows = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def append_rows(self, values, value_input_option="RAW"):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.offline:
+                raise ConnectionError("worksheet offline")
+            if self.fail_times:
+                self.fail_times -= 1
+                raise ConnectionError("simulated API error")
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                raise ConnectionError("simulated API error")
+            self.rows.extend(list(row) for row in values)
+
+    def append_row(self, values, value_input_option="RAW"):
+        self.append_rows([values], value_input_option)
@@ -0,0 +1,159 @@
+import cProfile
+import math
+import pstats
+import time
+from contextlib import contextmanager
+
+BUCKETS_PER_DECADE = 10
+MIN_EXPONENT = -6  # Smallest bucket edge: 1 µs
+MAX_EXPONENT = 2  # Largest bucket edge: 100 s
+
+
+class TimingHistogram:
+    """Fixed log-spaced histogram of durations, 10 buckets per decade from 1 µs to 100 s.
+
+    Recording is a log10 and an increment, so it can sit on every tick; percentiles
+    are read back as the upper edge of the bucket they fall in (within about 26%).
+    """
+
+    n_buckets = (MAX_EXPONENT - MIN_EXPONENT) * BUCKETS_PER_DECADE + 2  # Plus under- and overflow
+
+    def __init__(self):
+        self.counts = [0] * self.n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds <= 0:
+            index = 0
+        else:
+            index = math.floor((math.log10(seconds) - MIN_EXPONENT) * BUCKETS_PER_DECADE) + 1
+            index = min(max(index, 0), self.n_buckets - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @staticmethod
+    def upper_edge(index):
+        """Upper edge in seconds of a bucket; the overflow bucket is unbounded."""
+        if index >= TimingHistogram.n_buckets - 1:
+            return math.inf
+        return 10 ** (MIN_EXPONENT + index / BUCKETS_PER_DECADE)
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile, or the max if it is lower."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(q / 100 * self.count)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= max(rank, 1):
+                return min(self.upper_edge(index), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class StageTimings:
+    """One TimingHistogram per named stage of the tick loop and of end_race."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {}
+        self._lap_start = clock()
+
+    def start_lap(self):
+        """Start timing the first stage of a sequence of laps."""
+        self._lap_start = self.clock()
+
+    def lap(self, name):
+        """Record the time since the previous lap as one sample of the named stage."""
+        now = self.clock()
+        self.record(name, now - self._lap_start)
+        self._lap_start = now
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = TimingHistogram()
+        histogram.record(seconds)
+
+    def summary(self):
+        """Per-stage count, mean, p50, p95, p99 and max in milliseconds."""
+        return {
+            name: {
+                "count": h.count,
+                "mean_ms": h.mean * 1000,
+                "p50_ms": h.percentile(50) * 1000,
+                "p95_ms": h.percentile(95) * 1000,
+                "p99_ms": h.percentile(99) * 1000,
+                "max_ms": h.max * 1000,
+            }
+            for name, h in self.histograms.items()
+        }
+
+    def to_dict(self):
+        """Summary plus the raw bucket counts, for exporting with the race data."""
+        summary = self.summary()
+        return {
+            "bucket_upper_edges_s": [TimingHistogram.upper_edge(i) for i in range(TimingHistogram.n_buckets - 1)],
+            "stages": {
+                name: {**summary[name], "counts": list(h.counts)}
+                for name, h in self.histograms.items()
+            },
+        }
+
+
+class RaceProfiler:
+    """Opt-in cProfile capture of one race, dumped to a .prof file for pstats or snakeviz.
+
+    cProfile only sees the thread it is enabled on, and Streamlit runs every
+    fragment rerun on a new script thread, so each run is profiled on its own
+    inside capture() and the stats of all runs are merged into one file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.runs = 0
+        self.running = True
+        self._stats = None
+        self._capturing = False
+
+    @contextmanager
+    def capture(self):
+        """Profile the body of a with block, on the current thread, as part of the race."""
+        profile = cProfile.Profile()
+        self._capturing = True
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._capturing = False
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.runs += 1
+            if not self.running:
+                self._dump()  # Stopped from inside this capture
+
+    def stop(self):
+        """Stop profiling and write the stats file; returns its path, or None when nothing was captured.
+
+        Called from inside capture(), the file is written when the capture ends.
+        """
+        self.running = False
+        if not self._capturing:
+            self._dump()
+        return self.path if self._stats is not None or self._capturing else None
+
+    def _dump(self):
+        if self._stats is not None:
+            self._stats.dump_stats(self.path)
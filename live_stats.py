@@ -0,0 +1,57 @@
+import math
+from array import array
+
+
+class LaneStatistics:
+    """Cumulative hits of one lane's target bit against chance, updated in O(1) per tick.
+
+    Under the null every bit hits with probability 1/2. The Bayes factor compares
+    that with a hit rate drawn from a Beta(prior_a, prior_a) prior, which is
+    centred on 1/2; prior_a = 1 is the uniform prior.
+    """
+
+    def __init__(self, target_bit, prior_a=1.0):
+        self.target_bit = target_bit
+        self.prior_a = prior_a
+        self.n = 0
+        self.hits = 0
+        self.trace = array("d")  # Deviation after each tick
+
+    def update(self, ones, slot_size):
+        """Add one tick of slot_size bits of which ones are 1."""
+        self.hits += ones if self.target_bit == 1 else slot_size - ones
+        self.n += slot_size
+        self.trace.append(self.deviation)
+
+    @property
+    def deviation(self):
+        """Hits above (or below) the n / 2 expected by chance."""
+        return self.hits - self.n / 2
+
+    @property
+    def z_score(self):
+        return self.deviation / math.sqrt(self.n / 4) if self.n else 0.0
+
+    @property
+    def log_bayes_factor(self):
+        """Natural log of BF10, the evidence for a biased hit rate over a fair one."""
+        if not self.n:
+            return 0.0
+        a, k, n = self.prior_a, self.hits, self.n
+        log_beta = math.lgamma(a + k) + math.lgamma(a + n - k) - math.lgamma(2 * a + n)
+        log_prior_beta = 2 * math.lgamma(a) - math.lgamma(2 * a)
+        return log_beta - log_prior_beta - n * math.log(0.5)
+
+    @property
+    def bayes_factor(self):
+        """BF10; values above 1 favour a bias, below 1 favour chance."""
+        return math.exp(min(self.log_bayes_factor, 700.0))
+
+    def summary(self):
+        return {
+            "n": self.n,
+            "hits": self.hits,
+            "deviation": self.deviation,
+            "z_score": self.z_score,
+            "bayes_factor": self.bayes_factor,
+        }
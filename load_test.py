@@ -0,0 +1,295 @@
+"""Load test: many simulated players racing at once on one server process.
+
+Each player runs the whole app script through Streamlit's AppTest in its own
+thread. A player chooses a bit, starts a race, then wakes up every
+REQUEST_INTERVAL like the race timer in the browser. The race ends when a car
+wins, or it is stopped after race_ticks. The player then downloads the data,
+resets the game and races again. random.org and the Google Sheets worksheet are
+local fakes with configurable latency and failure rate.
+
+All players share one process, like sessions on one server: they share the
+cache_resource bit pool, results store and Sheets writer, and they share the
+GIL. Script runs take turns on a lock, because AppTest swaps process-wide
+runtime state during a run. The GIL already serializes CPU-bound script runs
+in much the same way. AppTest can only rerun the whole script, while the
+browser reruns just the race fragment, so each tick here costs more than on a
+real server. The session counts found are therefore a lower bound.
+
+    python load_test.py --sessions 1 2 4 8 16 --seconds 30
+    python load_test.py --sessions 8 --random-org-latency 0.5 --random-org-failure-rate 0.2
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types
+from fakes import FakeRandomOrgClient, FakeWorksheet
+from instrumentation import StageTimings
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mind_battle_car_game_streamlit2.py")
+TICK_INTERVAL = 0.5  # REQUEST_INTERVAL of the app
+RUN_TIMEOUT = 60  # Seconds one script run may take before AppTest gives up
+API_KEY = "load-test"  # Any non-empty key makes the app use the (fake) random.org pool
+MEMORY_SAMPLE_INTERVAL = 0.2
+
+_run_lock = threading.Lock()  # AppTest swaps process-wide runtime state, so script runs take turns
+
+
+def install_fake_backends(random_org, worksheet):
+    """Make the app's lazy imports of rdoclient, gspread and oauth2client return the fakes."""
+    rdoclient = types.ModuleType("rdoclient")
+    rdoclient.RandomOrgClient = lambda api_key: random_org
+    gspread = types.ModuleType("gspread")
+    spreadsheet = types.SimpleNamespace(sheet1=worksheet)
+    gspread.authorize = lambda credentials: types.SimpleNamespace(open=lambda name: spreadsheet)
+    service_account = types.ModuleType("oauth2client.service_account")
+    service_account.ServiceAccountCredentials = types.SimpleNamespace(
+        from_json_keyfile_dict=lambda info, scope: None
+    )
+    oauth2client = types.ModuleType("oauth2client")
+    oauth2client.service_account = service_account
+    sys.modules.update({
+        "rdoclient": rdoclient,
+        "gspread": gspread,
+        "oauth2client": oauth2client,
+        "oauth2client.service_account": service_account,
+    })
+
+
+def rss_bytes():
+    """Resident memory of this process now, or its peak where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SessionError(Exception):
+    """The app script raised during a simulated session."""
+
+
+class LoadStep:
+    """Measurements shared by the players of one step, recorded while holding the run lock."""
+
+    def __init__(self):
+        self.timings = StageTimings()
+        self.cpu = {}  # Process CPU seconds of the script runs, by action
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.late_ticks = 0  # Ticks rendered more than one interval after the timer woke the player
+        self.finished = 0
+        self.stopped = 0
+        self.downloads = 0
+        self.errors = []
+
+    def run(self, at, action):
+        """Run the script once for a player and record how long it waited, ran and computed."""
+        start = time.perf_counter()
+        with _run_lock:
+            waited = time.perf_counter() - start
+            cpu = time.process_time()
+            at.run()
+            self.cpu[action] = self.cpu.get(action, 0.0) + time.process_time() - cpu
+            elapsed = time.perf_counter() - start
+            self.timings.record("turn_wait", waited)
+            self.timings.record(action, elapsed - waited)
+            if action == "tick":
+                self.timings.record("tick_latency", elapsed)
+                self.late_ticks += elapsed > TICK_INTERVAL
+            elif action == "download":
+                self.downloads += 1
+        if at.exception:
+            raise SessionError(at.exception[0].value)
+
+
+class SimulatedPlayer(threading.Thread):
+    """One browser session: race, download, reset and race again until stop_at."""
+
+    def __init__(self, index, step, stop_at, race_ticks=120, slot_size=1000, n_lanes=2,
+                 move_multiplier=100, export_format="csv"):
+        super().__init__(name=f"player-{index}", daemon=True)
+        self.index = index
+        self.step = step
+        self.stop_at = stop_at
+        self.race_ticks = race_ticks
+        self.slot_size = slot_size
+        self.n_lanes = n_lanes
+        self.move_multiplier = move_multiplier
+        self.export_format = export_format
+        self._next_wakeup = time.monotonic()
+
+    def run(self):
+        try:
+            self._play()
+        except Exception as e:
+            self.step.errors.append(f"{self.name}: {e}")
+
+    def _wait_for_timer(self):
+        """Sleep until the race timer fires; wake-ups missed while busy are dropped, as in the browser."""
+        now = time.monotonic()
+        if now < self._next_wakeup:
+            time.sleep(self._next_wakeup - now)
+        else:
+            self._next_wakeup = now
+        self._next_wakeup += TICK_INTERVAL
+
+    def _act(self, at, action):
+        self._wait_for_timer()
+        self.step.run(at, action)
+
+    def _play(self):
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(APP_FILE, default_timeout=RUN_TIMEOUT)
+        at.secrets["google_sheets"] = {"credentials_json": "{}"}
+        self._act(at, "open")
+        at.sidebar.text_input(key="api_key_input").input(API_KEY)
+        at.sidebar.selectbox(key="slot_size").set_value(self.slot_size)
+        at.sidebar.selectbox(key="n_lanes").set_value(self.n_lanes)
+        at.sidebar.slider(key="move_multiplier").set_value(self.move_multiplier)
+        self._act(at, "settings")
+        while time.monotonic() < self.stop_at:
+            at.button(key=f"button{self.index % 2}").click()
+            self._act(at, "choose")
+            self._act(at, "choose")  # The start button is enabled from the run after the choice
+            at.sidebar.button(key="start_button").click()
+            self._act(at, "start")
+            for _ in range(self.race_ticks):
+                if not at.session_state.running or time.monotonic() >= self.stop_at:
+                    break
+                self._act(at, "tick")
+
+            with _run_lock:
+                scheduler = at.session_state.tick_scheduler
+                self.step.ticks += scheduler.ticks
+                self.step.overruns += scheduler.overruns
+                self.step.skipped_ticks += scheduler.skipped_ticks
+                if at.session_state.running:
+                    self.step.stopped += 1
+                else:
+                    self.step.finished += 1
+            if at.session_state.running:
+                at.sidebar.button(key="stop_button").click()
+                self._act(at, "stop")
+            if time.monotonic() >= self.stop_at:
+                break
+
+            at.sidebar.selectbox(key="export_format").set_value(self.export_format)
+            at.sidebar.button(key="download_button").click()
+            self._act(at, "download")
+            at.sidebar.button(key="reset_button").click()
+            self._act(at, "reset")
+
+
+def run_step(n_sessions, seconds, **player_options):
+    """Race n_sessions players for seconds and summarize the step."""
+    gc.collect()
+    baseline = peak = rss_bytes()
+    step = LoadStep()
+    start, cpu_start = time.monotonic(), time.process_time()
+    stop_at = start + seconds
+    players = [SimulatedPlayer(i, step, stop_at, **player_options) for i in range(n_sessions)]
+    for player in players:
+        player.start()
+    while any(player.is_alive() for player in players):
+        peak = max(peak, rss_bytes())
+        time.sleep(MEMORY_SAMPLE_INTERVAL)
+    elapsed = time.monotonic() - start
+    process_cpu = time.process_time() - cpu_start
+
+    summary = step.timings.summary()
+    ticks = max(step.ticks, 1)
+    script_cpu = sum(step.cpu.values())
+    return {
+        "sessions": n_sessions,
+        "seconds": elapsed,
+        "ticks": step.ticks,
+        "overrun_rate": step.overruns / ticks,
+        "skipped_ticks": step.skipped_ticks,
+        "late_tick_rate": step.late_ticks / ticks,
+        "tick_p50_ms": summary.get("tick", {}).get("p50_ms", 0.0),
+        "tick_p95_ms": summary.get("tick", {}).get("p95_ms", 0.0),
+        "tick_latency_p95_ms": summary.get("tick_latency", {}).get("p95_ms", 0.0),
+        "turn_wait_p95_ms": summary.get("turn_wait", {}).get("p95_ms", 0.0),
+        "cpu_ms_per_tick": step.cpu.get("tick", 0.0) / ticks * 1000,
+        "cpu_percent_per_session": script_cpu / elapsed / n_sessions * 100,
+        "process_cpu_percent": process_cpu / elapsed * 100,
+        "mb_per_session": (peak - baseline) / n_sessions / 1e6,
+        "finished": step.finished,
+        "stopped": step.stopped,
+        "downloads": step.downloads,
+        "errors": step.errors,
+        "stages": summary,
+    }
+
+
+def sustainable(result, max_overrun_rate):
+    """Whether a step kept the schedule: few overruns, most ticks on time and no errors."""
+    return (
+        not result["errors"]
+        and result["overrun_rate"] <= max_overrun_rate
+        and result["tick_latency_p95_ms"] < TICK_INTERVAL * 1000
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find how many simultaneous races one server process carries.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="session counts to try, in order; stops at the first that overruns")
+    parser.add_argument("--seconds", type=float, default=30, help="length of each step")
+    parser.add_argument("--race-ticks", type=int, default=120, help="stop a race with no winner after this many ticks")
+    parser.add_argument("--slot-size", type=int, default=1000)
+    parser.add_argument("--lanes", type=int, default=2)
+    parser.add_argument("--export-format", default="csv")
+    parser.add_argument("--random-org-latency", type=float, default=0.2, help="seconds per fake random.org call")
+    parser.add_argument("--random-org-failure-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-latency", type=float, default=0.5, help="seconds per fake worksheet call")
+    parser.add_argument("--sheets-failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-overrun-rate", type=float, default=0.01,
+                        help="largest share of overrunning ticks that still counts as sustainable")
+    parser.add_argument("--data-dir", help="results database, spool and recordings (default: a temporary directory)")
+    args = parser.parse_args(argv)
+
+    random_org = FakeRandomOrgClient(args.random_org_latency, args.random_org_failure_rate)
+    worksheet = FakeWorksheet(args.sheets_latency, failure_rate=args.sheets_failure_rate)
+    install_fake_backends(random_org, worksheet)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="mind_race_load_")
+    os.environ["MIND_RACE_DATA_DIR"] = data_dir
+    player_options = {
+        "race_ticks": args.race_ticks, "slot_size": args.slot_size, "n_lanes": args.lanes,
+        "export_format": args.export_format,
+    }
+
+    # Load the modules and fill the shared caches before measuring memory
+    run_step(1, 3 * TICK_INTERVAL, **player_options)
+
+    print(f"data in {data_dir}; tick interval {TICK_INTERVAL * 1000:.0f} ms; times in ms")
+    print(f"{'sessions':>8} {'ticks':>6} {'overrun':>8} {'late':>6} {'tick p50':>9} {'tick p95':>9} "
+          f"{'latency p95':>12} {'cpu/tick':>9} {'cpu %/sess':>10} {'MB/sess':>8} {'races':>6} {'errors':>6}")
+    best = 0
+    for n in args.sessions:
+        result = run_step(n, args.seconds, **player_options)
+        print(f"{n:>8} {result['ticks']:>6} {result['overrun_rate']:>8.1%} {result['late_tick_rate']:>6.1%} "
+              f"{result['tick_p50_ms']:>9.1f} {result['tick_p95_ms']:>9.1f} {result['tick_latency_p95_ms']:>12.1f} "
+              f"{result['cpu_ms_per_tick']:>9.1f} {result['cpu_percent_per_session']:>10.1f} "
+              f"{result['mb_per_session']:>8.1f} {result['finished'] + result['stopped']:>6} {len(result['errors']):>6}")
+        for error in result["errors"][:3]:
+            print(f"  {error}")
+        if not sustainable(result, args.max_overrun_rate):
+            break
+        best = n
+
+    print(f"random.org: {random_org.calls} calls, {random_org.failures} failed; "
+          f"sheets: {worksheet.calls} calls, {len(worksheet.rows)} rows")
+    print(f"max sustainable sessions: {best}" + (f" of {args.sessions[-1]} tried" if best == args.sessions[-1] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
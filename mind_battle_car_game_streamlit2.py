@@ -1,64 +1,87 @@
 import streamlit as st
 import time
 import numpy as np
-import pandas as pd
-from PIL import Image
 import base64
 import io
 import os
-from rdoclient import RandomOrgClient
+import tempfile
+from contextlib import nullcontext
 import json
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-
-MAX_BATCH_SIZE = 1000  # Maximum batch size for requests to random.org
+from bit_sources import (
+    CircuitBreaker,
+    PackedBitLog,
+    RandomOrgBitPool,
+    SerialBitPool,
+    get_random_packed_slots,
+    spawn_local_generator,
+)
+from instrumentation import RaceProfiler, StageTimings
+from live_stats import LaneStatistics
+from race_engine import START_POS, LaneRace, count_ones_packed, lane_targets
+from race_export import EXPORT_FORMATS, TickLog, available_formats
+from race_recording import RaceRecorder
+from results_store import ResultsStore
+from sheets_writer import SheetsWriter
+from sound_effects import SOUND_FILES, data_url, installer_html, transcode, trigger_html
+from tick_scheduler import TickScheduler
+
+MAX_BATCH_SIZE = 1000  # Bits per random.org request for slots up to this size
+MAX_BLOB_BITS = 1 << 20  # Largest blob random.org returns in one request
+SLOT_SIZES = [1_000, 10_000, 100_000, 1_000_000]  # Bits per slot and tick to choose from
+LANE_COUNTS = [2, 4, 6, 8]  # Cars per race; even lanes are the green team, odd lanes the red team
 RETRY_LIMIT = 3  # Number of retry attempts for random.org requests
 REQUEST_INTERVAL = 0.5  # Interval between requests (in seconds)
+BREAKER_COOLDOWN = 30  # Seconds to stop calling random.org after RETRY_LIMIT consecutive failures
+TICK_OVERRUN_POLICY = TickScheduler.SKIP  # What to do with ticks missed after a slow one
+LIVE_CHART_TICKS = 200  # Latest ticks in the live statistics chart
+LIVE_CHART_INTERVAL = 5.0  # Seconds between redraws of the live statistics chart during a race
+RECORDINGS_DIR = "recordings"  # Raw bits of every race, replayable with race_recording.py
+SERIAL_BAUDRATE = 115200  # Baud rate of hardware random number generators on a serial port
+RESULTS_SPOOL = "race_results_spool.jsonl"  # Rows kept locally while Google Sheets is unreachable
+RESULTS_DB = "race_results.sqlite3"  # Local store of every race, for the leaderboard
+SYNC_RESULTS_TO_SHEETS = True  # Forward stored results to Google Sheets in the background
+LEADERBOARD_SIZE = 10
+
+@st.cache_resource(show_spinner=False)
+def get_random_org_pool(api_key):
+    """Create the RANDOM.ORG client and its shared bit pool once per process and API key.
+
+    Bits are fetched as base64 blobs. The pool starts sized for the smallest
+    race and grows with the largest one that uses it, see configure_random_org.
+    """
+    from rdoclient import RandomOrgClient  # Only needed once an API key is entered
+
+    client = RandomOrgClient(api_key)
+    breaker = CircuitBreaker(failure_threshold=RETRY_LIMIT, cooldown=BREAKER_COOLDOWN)
+    return RandomOrgBitPool(
+        client, batch_size=MAX_BATCH_SIZE, capacity=16 * MAX_BATCH_SIZE, breaker=breaker, blobs=True,
+    )
 
-def configure_random_org(api_key):
-    """Configure the RANDOM.ORG client if the API key is valid."""
+def configure_random_org(api_key, slot_size=1000, n_lanes=2):
+    """Configure the shared RANDOM.ORG bit pool if the API key is valid.
+
+    The buffer holds at least four ticks of every lane, and a request fetches
+    up to one slot.
+    """
     try:
-        client = RandomOrgClient(api_key)
-        return client
+        pool = get_random_org_pool(api_key)
     except Exception as e:
         st.error(f"Error configuring the random.org client: {e}")
         return None
+    pool.grow(4 * n_lanes * slot_size, min(max(slot_size, MAX_BATCH_SIZE), MAX_BLOB_BITS))
+    return pool
 
-def get_random_bits_from_random_org(num_bits, client=None):
-    """Get random bits from random.org or use a local pseudorandom generator."""
-    try:
-        if client:
-            # Use RANDOM.ORG
-            random_bits = client.generate_integers(num_bits, 0, 1)
-            return random_bits, True
-        else:
-            # Use a local pseudorandom generator
-            random_bits = get_local_random_bits(num_bits)
-            return random_bits, False
-    except Exception:
-        # In case of error, use a local pseudorandom generator
-        random_bits = get_local_random_bits(num_bits)
-        return random_bits, False
-
-def get_local_random_bits(num_bits):
-    """Generate pseudorandom bits locally."""
-    return list(np.random.randint(0, 2, size=num_bits))
-
-def calculate_entropy(bits):
-    """Calculate entropy using Shannon's formula."""
-    n = len(bits)
-    counts = np.bincount(bits, minlength=2)
-    p = counts / n
-    p = p[np.nonzero(p)]
-    entropy = -np.sum(p * np.log2(p))
-    return entropy
-
-def move_car(car_pos, distance):
-    """Move the car a certain distance."""
-    car_pos += distance
-    if car_pos > 900:  # Shorten the track to leave room for the flag
-        car_pos = 900
-    return car_pos
+@st.cache_resource(show_spinner=False, max_entries=1, on_release=lambda pool: pool.close())
+def get_serial_pool(port):
+    """Start reading a hardware random number generator on a serial port once per process.
+
+    Two readers on one device would each get part of the stream, so only one
+    pool exists: entering another port closes the previous one. The buffer
+    holds four ticks of every lane of the largest race.
+    """
+    breaker = CircuitBreaker(failure_threshold=RETRY_LIMIT, cooldown=BREAKER_COOLDOWN)
+    capacity = max(1 << 23, 4 * max(LANE_COUNTS) * max(SLOT_SIZES))
+    return SerialBitPool(port, SERIAL_BAUDRATE, capacity=capacity, breaker=breaker)
 
 def image_to_base64(image):
     """Convert an image to base64."""
@@ -66,22 +89,138 @@ def image_to_base64(image):
     image.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode()
 
-def configure_google_sheets(sheet_name):
-    """Configure Google Sheets using credentials from Streamlit Secrets."""
+IMAGE_DIR = os.path.abspath(os.path.dirname(__file__))
+# Results database, spool and recordings; load_test.py points this at a temporary directory
+DATA_DIR = os.environ.get("MIND_RACE_DATA_DIR", IMAGE_DIR)
+CAR_SIZE = (150, 150)  # Cars and flag
+NUMBER_SIZE = (120, 120)  # Number images, slightly smaller than the cars
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def load_image_base64(path, mtime, size):
+    """Decode, resize and base64-encode an image once per process, file version and size."""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return image_to_base64(image.resize(size))
+
+def image_asset(file_name, size):
+    """Base64 PNG of an image in the game folder, reloaded only when the file changes."""
+    path = os.path.join(IMAGE_DIR, file_name)
+    return load_image_base64(path, os.path.getmtime(path), size)
+
+def number_asset(bit, color):
+    """Base64 PNG of the digit shown on a car, e.g. 0green.png."""
+    return image_asset(f"{bit}{color}.png", NUMBER_SIZE)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_sound_data_url(path, mtime):
+    """Transcode a sound to a compact format once per process and file version, as a data URL."""
+    return data_url(*transcode(path))
+
+def sound_sources():
+    """Data URL of every sound effect, reloaded only when a file changes."""
+    sources = {}
+    for name, file_name in SOUND_FILES.items():
+        path = os.path.join(IMAGE_DIR, file_name)
+        sources[name] = load_sound_data_url(path, os.path.getmtime(path))
+    return sources
+
+DELTA_RENDERING = True  # Send the track once per run and only the car positions every tick
+
+def lane_html(lane, car_base64, number_base64, flag_base64, show_number, first=False):
+    """Static markup of one lane; the car and number are placed by positions_css."""
+    return f"""
+            <div class="slider-container{' first' if first else ''}">
+                <img src="data:image/png;base64,{car_base64}" class="car-image {lane}-car">
+                <img src="data:image/png;base64,{number_base64}" class="number-image {lane}-number {'show' if show_number else ''}"
+                     style="top: 34px; z-index: 10;">
+                <input type="range" min="0" max="1000" value="0" disabled>
+                <img src="data:image/png;base64,{flag_base64}" class="flag-image">
+            </div>
+            """
+
+def positions_css(positions):
+    """CSS that moves the car and number of every lane; positions[i] is lane i's position."""
+    rules = "".join(
+        f".slider-container .car-image.lane-{lane}-car {{ left: calc(-71px + {pos / 10}%); }}"
+        f".slider-container .number-image.lane-{lane}-number {{ left: calc(-43px + {pos / 10}%); }}"
+        for lane, pos in enumerate(positions)
+    )
+    return f"<style>{rules}</style>"
+
+def lane_team(lane):
+    """Team of a lane: even lanes are green (the player's bit), odd lanes red (the other bit)."""
+    return "green" if lane % 2 == 0 else "red"
+
+def lane_label(lane, n_lanes):
+    """Short name of a lane, e.g. green, or green 2 when each team has several cars."""
+    return lane_team(lane) if n_lanes == 2 else f"{lane_team(lane)} {lane // 2 + 1}"
+
+def display_order(n_lanes):
+    """Lanes from the top of the page down: each red car above its green partner, as in the two-car game."""
+    return [lane ^ 1 for lane in range(n_lanes)]
+
+def configure_google_sheets(sheet_name, credentials_info):
+    """Configure Google Sheets with the service account credentials."""
+    # Imported here, in the writer thread, so page loads never pay for them
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    credentials_info = json.loads(st.secrets["google_sheets"]["credentials_json"])
     credentials = ServiceAccountCredentials.from_json_keyfile_dict(credentials_info, scope)
     client = gspread.authorize(credentials)
     sheet = client.open(sheet_name)
     sheet1 = sheet.sheet1  # First sheet
     return sheet1
 
-def save_race_data(sheet, race_data):
-    """Save race data to Google Sheets."""
+@st.cache_resource(show_spinner=False)
+def get_results_writer(sheet_name):
+    """Create the background Google Sheets writer once per process and sheet.
+
+    Credentials are read here from Streamlit Secrets; authorizing and opening the
+    spreadsheet happen later in the writer thread, on the first row to save.
+    """
+    credentials_info = json.loads(st.secrets["google_sheets"]["credentials_json"])
+    return SheetsWriter(
+        lambda: configure_google_sheets(sheet_name, credentials_info),
+        spool_path=os.path.join(DATA_DIR, RESULTS_SPOOL),
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_results_store(sheet_name):
+    """Open the local results database once per process; it feeds the Google Sheets writer when syncing."""
+    sync = get_results_writer(sheet_name).submit if SYNC_RESULTS_TO_SHEETS else None
+    return ResultsStore(os.path.join(DATA_DIR, RESULTS_DB), sync=sync)
+
+def save_race_data(store, race_data, winner_team):
+    """Queue race data for the local store (and from there Google Sheets) without waiting."""
     try:
-        sheet.append_row(race_data)
+        store.submit(race_data, winner_team)
     except Exception as e:
-        st.error(f"Error saving data to Google Sheets: {e}")
+        st.error(f"Error saving data: {e}")
+
+def deferred_export(path):
+    """Data callable for st.download_button that reads an export from disk when the user clicks.
+
+    Streamlit keeps the whole download in memory either way, so the file is read and closed here;
+    discard_export deletes it later, once nothing has it open.
+    """
+    def read_export():
+        with open(path, "rb") as export:
+            return export.read()
+    return read_export
+
+def discard_export(path):
+    """Delete the export file of the previous race, downloaded or not."""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def mask_email(email):
+    """Show enough of an email to recognise oneself on the leaderboard, e.g. ri***@gmail.com."""
+    if not email:
+        return "—"
+    name, _, domain = email.partition("@")
+    return f"{name[:2]}***@{domain}" if domain else f"{name[:2]}***"
 
 def main():
     st.set_page_config(page_title="Car Mind Race", layout="wide")
@@ -129,6 +268,7 @@ def main():
         email_input_text = "Inserisci la tua email (opzionale):"
         privacy_info_text = "I dati saranno utilizzati solo per scopi di ricerca scientifica nel rispetto delle leggi vigenti sulla privacy."
         move_multiplier_text = "Moltiplicatore di Movimento"
+        exact_threshold_text = "Soglia esatta (distribuzione binomiale)"
         email_ref_text = "Riferimento Email: riccardoboscariol97@gmail.com"
         api_description_text = "Per garantire il corretto utilizzo, è consigliabile acquistare un piano per l'inserimento della chiave API da questo sito: [https://api.random.org/pricing](https://api.random.org/pricing)."
     else:
@@ -157,6 +297,7 @@ def main():
         email_input_text = "Enter your email (optional):"
         privacy_info_text = "The data will be used solely for scientific research purposes in compliance with applicable privacy laws."
         move_multiplier_text = "Movement Multiplier"
+        exact_threshold_text = "Exact threshold (binomial distribution)"
         email_ref_text = "Email Referee: riccardoboscariol97@gmail.com"
         api_description_text = "To ensure proper use, it is advisable to purchase a plan for entering the API key from this site: [https://api.random.org/pricing](https://api.random.org/pricing)."
 
@@ -285,28 +426,17 @@ def main():
 
     if "player_choice" not in st.session_state:
         st.session_state.player_choice = None
-    if "car_pos" not in st.session_state:
-        st.session_state.car_pos = 50
-    if "car2_pos" not in st.session_state:
-        st.session_state.car2_pos = 50
-    if "car1_moves" not in st.session_state:
-        st.session_state.car1_moves = 0
-    if "car2_moves" not in st.session_state:
-        st.session_state.car2_moves = 0
-    if "random_numbers_1" not in st.session_state:
-        st.session_state.random_numbers_1 = []
-    if "random_numbers_2" not in st.session_state:
-        st.session_state.random_numbers_2 = []
-    if "data_for_excel_1" not in st.session_state:
-        st.session_state.data_for_excel_1 = []
-    if "data_for_excel_2" not in st.session_state:
-        st.session_state.data_for_excel_2 = []
-    if "data_for_condition_1" not in st.session_state:
-        st.session_state.data_for_condition_1 = []
-    if "data_for_condition_2" not in st.session_state:
-        st.session_state.data_for_condition_2 = []
+    if "race" not in st.session_state:
+        # Positions, moves and entropy history of every lane; created when a race starts
+        st.session_state.race = None
+    if "lane_bits" not in st.session_state:
+        st.session_state.lane_bits = [PackedBitLog(), PackedBitLog()]
+    if "tick_log" not in st.session_state:
+        st.session_state.tick_log = TickLog()
     if "car_start_time" not in st.session_state:
         st.session_state.car_start_time = None
+    if "tick_scheduler" not in st.session_state:
+        st.session_state.tick_scheduler = TickScheduler(REQUEST_INTERVAL, TICK_OVERRUN_POLICY)
     if "best_time" not in st.session_state:
         st.session_state.best_time = None
     if "running" not in st.session_state:
@@ -315,6 +445,27 @@ def main():
         st.session_state.widget_key_counter = 0
     if "show_retry_popup" not in st.session_state:
         st.session_state.show_retry_popup = False
+    if "bit_underruns" not in st.session_state:
+        st.session_state.bit_underruns = 0
+    if "local_rng" not in st.session_state:
+        st.session_state.local_rng = spawn_local_generator()
+    if "stage_timings" not in st.session_state:
+        st.session_state.stage_timings = StageTimings()
+    if "race_profiler" not in st.session_state:
+        st.session_state.race_profiler = None
+    if "race_recorder" not in st.session_state:
+        st.session_state.race_recorder = None
+    if "sounds_sent" not in st.session_state:
+        st.session_state.sounds_sent = False
+    if "sound_triggers" not in st.session_state:
+        st.session_state.sound_triggers = 0
+    if "lane_stats" not in st.session_state:
+        # One per lane, each against its lane's target bit
+        st.session_state.lane_stats = None
+    if "pending_sounds" not in st.session_state:
+        st.session_state.pending_sounds = []
+    if "race_result" not in st.session_state:
+        st.session_state.race_result = None
 
     # Richiesta del consenso e dell'email all'inizio del gioco
     st.session_state.consent_choice = st.radio(consent_text, ["Sì", "No"])
@@ -334,15 +485,64 @@ def main():
         api_key_text, key="api_key_input", value=st.session_state.api_key, type="password"
     )
 
-    client = None
-    if st.session_state.api_key:
-        client = configure_random_org(st.session_state.api_key)
+    # Bits per slot, fixed for the length of a race
+    slot_size = st.sidebar.selectbox(
+        "Bit per slot" if st.session_state.language == "Italiano" else "Bits per slot",
+        SLOT_SIZES, key="slot_size", disabled=st.session_state.running,
+    )
+    if "race_slot_size" not in st.session_state:
+        st.session_state.race_slot_size = slot_size
+
+    # Cars per race, also fixed for the length of a race
+    n_lanes = st.sidebar.selectbox(
+        "Corsie" if st.session_state.language == "Italiano" else "Lanes",
+        LANE_COUNTS, key="n_lanes", disabled=st.session_state.running,
+    )
+    race = st.session_state.race
+    if race is not None and race.n_lanes != n_lanes:
+        race = None  # Show a fresh track for the new lane count until the next race starts
+
+    # A hardware generator on a serial port, e.g. /dev/ttyUSB0 or COM3, replaces random.org
+    serial_port = st.sidebar.text_input(
+        "Porta seriale RNG hardware" if st.session_state.language == "Italiano" else "Hardware RNG serial port",
+        key="serial_port", disabled=st.session_state.running,
+    ).strip()
+
+    bit_pool = None
+    if serial_port:
+        bit_pool = get_serial_pool(serial_port)
+    elif st.session_state.api_key:
+        bit_pool = configure_random_org(st.session_state.api_key, st.session_state.race_slot_size, n_lanes)
 
     st.sidebar.markdown(api_description_text)
+    random_org_status_placeholder = st.sidebar.empty()
+
+    def show_random_org_status():
+        """Show the circuit breaker state and the buffer underruns of this session."""
+        if not bit_pool:
+            return
+        state = bit_pool.breaker.state
+        if state == CircuitBreaker.OPEN:
+            state += f" ({bit_pool.breaker.remaining_cooldown():.0f} s)"
+        if isinstance(bit_pool, SerialBitPool):
+            random_org_status_placeholder.caption(
+                f"{serial_port}: {state} · {bit_pool.throughput() / 1000:.1f} kbit/s · "
+                f"buffer underruns: {st.session_state.bit_underruns}"
+            )
+            return
+        random_org_status_placeholder.caption(
+            f"random.org: {state} · buffer underruns: {st.session_state.bit_underruns}"
+        )
+
+    show_random_org_status()
 
     download_menu = st.sidebar.expander("Download")
     with download_menu:
+        export_format = st.selectbox(
+            "Format", available_formats(st.session_state.lane_bits[0].slot_size), key="export_format"
+        )
         download_button = st.button(download_data_text, key="download_button")
+        timings_placeholder = st.empty()
     reset_button = st.sidebar.button(reset_game_text, key="reset_button")
 
     # Default move multiplier set to 50 instead of 20
@@ -350,36 +550,77 @@ def main():
         move_multiplier_text, min_value=1, max_value=100, value=50, key="move_multiplier"
     )
 
+    # Use the exact 5th percentile of the null distribution instead of the empirical one
+    exact_threshold = st.sidebar.checkbox(exact_threshold_text, key="exact_threshold")
+
+    sound_on = st.sidebar.checkbox(
+        "Effetti sonori" if st.session_state.language == "Italiano" else "Sound effects", value=True, key="sound_on"
+    )
+
+    # Optional per-stage timing of the tick loop and an opt-in cProfile capture of the next race
+    diagnostics_menu = st.sidebar.expander("Diagnostics")
+    with diagnostics_menu:
+        show_diagnostics = st.checkbox("Stage timings", key="show_diagnostics")
+        profile_next_race = st.checkbox("Profile next race (cProfile)", key="profile_next_race")
+        diagnostics_placeholder = st.empty()
+
+    def show_stage_timings():
+        """Show p50/p95/p99 per stage in milliseconds."""
+        if not show_diagnostics:
+            return
+        summary = st.session_state.stage_timings.summary()
+        diagnostics_placeholder.dataframe(
+            [
+                {"stage": name, "n": s["count"], "p50": round(s["p50_ms"], 3),
+                 "p95": round(s["p95_ms"], 3), "p99": round(s["p99_ms"], 3)}
+                for name, s in summary.items()
+            ],
+            hide_index=True,
+        )
+
+    show_stage_timings()
+
+    # Live cumulative statistics of each lane's target bit against chance, shown under the track
+    stats_menu = st.sidebar.expander("Statistiche live" if st.session_state.language == "Italiano" else "Live statistics")
+    with stats_menu:
+        show_live_stats = st.checkbox("Z-score / Bayes factor", key="show_live_stats")
+
+    # Local results store, shared by every session, and the leaderboard built on it
+    results_store = get_results_store("test")
+    leaderboard_menu = st.sidebar.expander("Classifica" if st.session_state.language == "Italiano" else "Leaderboard")
+    with leaderboard_menu:
+        if st.session_state.best_time is not None:
+            st.caption(
+                f"{'Il tuo miglior tempo' if st.session_state.language == 'Italiano' else 'Your best time'}: "
+                f"{st.session_state.best_time:.1f} s"
+            )
+        same_multiplier = st.checkbox(
+            "Solo questo moltiplicatore" if st.session_state.language == "Italiano" else "This multiplier only",
+            value=True, key="leaderboard_same_multiplier",
+        )
+        multiplier_filter = float(st.session_state.get("move_multiplier", 50)) if same_multiplier else None
+        try:
+            fastest = results_store.leaderboard(multiplier_filter, LEADERBOARD_SIZE)
+            players = results_store.best_times(multiplier_filter, LEADERBOARD_SIZE)
+        except Exception as e:
+            fastest, players = [], []
+            st.caption(f"Leaderboard unavailable: {e}")
+        st.dataframe(
+            [{"player": mask_email(r["email"]), "s": round(r["total_time"], 1), "x": r["move_multiplier"]}
+             for r in fastest],
+            hide_index=True,
+        )
+        st.caption("Miglior tempo per giocatore" if st.session_state.language == "Italiano" else "Best time per player")
+        st.dataframe(
+            [{"player": mask_email(r["email"]), "s": round(r["total_time"], 1)} for r in players],
+            hide_index=True,
+        )
+
     # Add email reference at the bottom of the sidebar
     st.sidebar.markdown(f"### {email_ref_text}")
 
-    image_dir = os.path.abspath(os.path.dirname(__file__))
-    car_image = Image.open(os.path.join(image_dir, "car.png")).resize((150, 150))  # Red car
-    car2_image = Image.open(os.path.join(image_dir, "car2.png")).resize((150, 150))  # Green car
-    flag_image = Image.open(os.path.join(image_dir, "bandierina.png")).resize(
-        (150, 150)
-    )  # Flag of the same size as the cars
-
-    # Load images for numbers and resize further to 120x120 pixels
-    number_0_green_image = Image.open(os.path.join(image_dir, "0green.png")).resize(
-        (120, 120)
-    )  # Slightly larger
-    number_1_green_image = Image.open(os.path.join(image_dir, "1green.png")).resize(
-        (120, 120)
-    )  # Slightly larger
-    number_0_red_image = Image.open(os.path.join(image_dir, "0red.png")).resize(
-        (120, 120)
-    )  # Slightly larger
-    number_1_red_image = Image.open(os.path.join(image_dir, "1red.png")).resize(
-        (120, 120)
-    )  # Slightly larger
-
     st.write(choose_bit_text)
 
-    # Initialize number images with default values
-    green_car_number_image = number_0_green_image
-    red_car_number_image = number_1_red_image
-
     # Determine which number image to display for each car
     col1, col2 = st.columns([1, 1])
     with col1:
@@ -399,23 +640,14 @@ def main():
 
     if button1:
         st.session_state.player_choice = 1
-        st.session_state.green_car_number_image = number_1_green_image
-        st.session_state.red_car_number_image = number_0_red_image
         st.session_state.button1_active = True
         st.session_state.button0_active = False
 
     if button0:
         st.session_state.player_choice = 0
-        st.session_state.green_car_number_image = number_0_green_image
-        st.session_state.red_car_number_image = number_1_red_image
         st.session_state.button0_active = True
         st.session_state.button1_active = False
 
-    # Assign the chosen images if a choice has been made
-    if st.session_state.player_choice is not None:
-        green_car_number_image = st.session_state.green_car_number_image
-        red_car_number_image = st.session_state.red_car_number_image
-
     # Active button style
     active_button_style = """
     <style>
@@ -429,115 +661,124 @@ def main():
     if st.session_state.player_choice == 1 or st.session_state.player_choice == 0:
         st.markdown(active_button_style, unsafe_allow_html=True)
 
-    car_image_base64 = image_to_base64(car_image)
-    car2_image_base64 = image_to_base64(car2_image)
-    flag_image_base64 = image_to_base64(flag_image)
-    red_car_number_base64 = image_to_base64(red_car_number_image)
-    green_car_number_base64 = image_to_base64(green_car_number_image)
-
-    car_placeholder = st.empty()
-    car2_placeholder = st.empty()
-
-    def display_cars():
-        """Display the cars and the images of the selected numbers."""
-        car_placeholder.markdown(
-            f"""
-            <div class="slider-container first">
-                <!-- Car image and position -->
-                <img src="data:image/png;base64,{car_image_base64}" class="car-image" style="left:calc(-71px + {st.session_state.car_pos / 10}%)">
-                <!-- Red car number image -->
-                <img src="data:image/png;base64,{red_car_number_base64}" class="number-image {'show' if st.session_state.player_choice is not None else ''}" 
-                     style="left:calc(-43px + {st.session_state.car_pos / 10}%); top: 34px; z-index: 10;">
-                <input type="range" min="0" max="1000" value="{st.session_state.car_pos}" disabled>
-                <img src="data:image/png;base64,{flag_image_base64}" class="flag-image">
-            </div>
-        """,
-            unsafe_allow_html=True,
-        )
+    # Decoded and encoded once per process; green shows 0 and red 1 until a bit is chosen
+    car_image_base64 = image_asset("car.png", CAR_SIZE)  # Red car
+    car2_image_base64 = image_asset("car2.png", CAR_SIZE)  # Green car
+    flag_image_base64 = image_asset("bandierina.png", CAR_SIZE)  # Flag of the same size as the cars
+    green_bit = st.session_state.player_choice if st.session_state.player_choice is not None else 0
+    green_car_number_base64 = number_asset(green_bit, "green")
+    red_car_number_base64 = number_asset(1 - green_bit, "red")
+
+    if sound_on and not st.session_state.sounds_sent:
+        # The audio goes to the browser once per session; the page keeps it across reruns
+        st.iframe(installer_html(sound_sources()))  # Sized to its content, which is only a script
+        st.session_state.sounds_sent = True
+
+    def play_sounds(*names):
+        """Queue sounds for the next render of the race area."""
+        if sound_on:
+            st.session_state.pending_sounds.extend(names)
+
+    def flush_sounds():
+        """Play the queued sounds already in the page; only a tiny script goes out, never audio data."""
+        names = st.session_state.pending_sounds
+        if not names:
+            return
+        st.session_state.pending_sounds = []
+        st.session_state.sound_triggers += 1
+        st.iframe(trigger_html(names, st.session_state.sound_triggers))
+
+    def draw_lanes():
+        """Send the markup of every lane with its images."""
+        show = st.session_state.player_choice is not None
+        for i, lane in enumerate(display_order(n_lanes)):
+            if lane_team(lane) == "green":
+                car_base64, number_base64 = car2_image_base64, green_car_number_base64
+            else:
+                car_base64, number_base64 = car_image_base64, red_car_number_base64
+            st.markdown(
+                lane_html(f"lane-{lane}", car_base64, number_base64, flag_image_base64, show, first=i == 0),
+                unsafe_allow_html=True,
+            )
 
-        car2_placeholder.markdown(
-            f"""
-            <div class="slider-container">
-                <!-- Green car image and position -->
-                <img src="data:image/png;base64,{car2_image_base64}" class="car-image" style="left:calc(-71px + {st.session_state.car2_pos / 10}%)">
-                <!-- Green car number image -->
-                <img src="data:image/png;base64,{green_car_number_base64}" class="number-image {'show' if st.session_state.player_choice is not None else ''}" 
-                     style="left:calc(-43px + {st.session_state.car2_pos / 10}%); top: 34px; z-index: 10;">
-                <input type="range" min="0" max="1000" value="{st.session_state.car2_pos}" disabled>
-                <img src="data:image/png;base64,{flag_image_base64}" class="flag-image">
-            </div>
-        """,
-            unsafe_allow_html=True,
-        )
+    def current_positions():
+        """Positions of the race shown on the track, or the start line when there is none."""
+        race = st.session_state.race
+        if race is None or race.n_lanes != n_lanes:
+            return np.full(n_lanes, float(START_POS))
+        return race.positions
 
     def update_car_positions():
         """Update the positions of the cars on the screen."""
-        car_placeholder.markdown(
-            f"""
-            <div class="slider-container first">
-                <img src="data:image/png;base64,{car_image_base64}" class="car-image" style="left:calc(-71px + {st.session_state.car_pos / 10}%)">
-                <img src="data:image/png;base64,{red_car_number_base64}" class="number-image {'show' if st.session_state.player_choice is not None else ''}" 
-                     style="left:calc(-43px + {st.session_state.car_pos / 10}%); top: 34px; z-index: 10;">
-                <input type="range" min="0" max="1000" value="{st.session_state.car_pos}" disabled>
-                <img src="data:image/png;base64,{flag_image_base64}" class="flag-image">
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-        car2_placeholder.markdown(
-            f"""
-            <div class="slider-container">
-                <img src="data:image/png;base64,{car2_image_base64}" class="car-image" style="left:calc(-71px + {st.session_state.car2_pos / 10}%)">
-                <img src="data:image/png;base64,{green_car_number_base64}" class="number-image {'show' if st.session_state.player_choice is not None else ''}" 
-                     style="left:calc(-43px + {st.session_state.car2_pos / 10}%); top: 34px; z-index: 10;">
-                <input type="range" min="0" max="1000" value="{st.session_state.car2_pos}" disabled>
-                <img src="data:image/png;base64,{flag_image_base64}" class="flag-image">
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    display_cars()
-
-    def check_winner():
-        """Check if there is a winner."""
-        if st.session_state.car_pos >= 900:  # Shorten the track to leave room for the flag
-            return "Rossa" if st.session_state.language == "Italiano" else "Red"
-        elif st.session_state.car2_pos >= 900:  # Shorten the track to leave room for the flag
-            return "Verde" if st.session_state.language == "Italiano" else "Green"
-        return None
+        if not DELTA_RENDERING:
+            draw_lanes()  # Re-send the whole markup with the images every tick
+        # Only a few hundred bytes of CSS move the cars already on the page
+        st.markdown(positions_css(current_positions()), unsafe_allow_html=True)
+
+    def show_live_stats_values():
+        """Show the current deviation, z-score and Bayes factor of every lane."""
+        if not show_live_stats or not st.session_state.lane_stats:
+            return
+        lanes = st.session_state.lane_stats
+        st.caption("  \n".join(
+            f"{lane_label(lane, len(lanes))}: dev {stats.deviation:+.0f} · z {stats.z_score:+.2f} · "
+            f"BF {stats.bayes_factor:.3g}"
+            for lane, stats in enumerate(lanes)
+        ))
+
+    def winner_name(lane):
+        """Name of the winning car in the page language, with its number when a team has several cars."""
+        if st.session_state.language == "Italiano":
+            name = "Verde" if lane_team(lane) == "green" else "Rossa"
+        else:
+            name = "Green" if lane_team(lane) == "green" else "Red"
+        return name if st.session_state.race.n_lanes == 2 else f"{name} {lane // 2 + 1}"
 
-    def end_race(winner):
-        """End the race and show the winner."""
+    def end_race(winner_lane):
+        """End the race and keep its outcome to show until the next race starts."""
+        timings = st.session_state.stage_timings
+        timings.start_lap()
         st.session_state.running = False
         st.session_state.show_retry_popup = True
-        st.success(win_message.format(winner))
+        winner = winner_name(winner_lane)
+        play_sounds("win" if lane_team(winner_lane) == "green" else "lose")
 
-        # Calculate the total race time and car speeds
+        # Calculate the total race time and car speeds; lane 0 is the green car, lane 1 the red one
+        race = st.session_state.race
         total_time = time.time() - st.session_state.car_start_time
-        red_car_speed = st.session_state.car_pos / total_time
-        green_car_speed = st.session_state.car2_pos / total_time
+        red_car_speed = race.positions[1] / total_time
+        green_car_speed = race.positions[0] / total_time
+        result = {
+            "message": win_message.format(winner),
+            "speed": race.positions[winner_lane] / total_time,  # Speed of the winning car
+            "profile": None,
+        }
+
+        if lane_team(winner_lane) == "green":
+            # Best win of this player, across sessions when an email was given
+            previous = [st.session_state.best_time]
+            if email:
+                previous.append(results_store.best_time(email))
+            st.session_state.best_time = min([t for t in previous if t is not None] + [total_time])
+
+        timing = st.session_state.tick_scheduler.stats()
+        green_stats, red_stats = st.session_state.lane_stats[:2]
+        timings.lap("end_race_stats")
 
-        # Display the speed of the winning car
-        if winner == "Rossa":
-            st.info(f"Velocità dell'auto vincente: {red_car_speed:.2f}")
-        else:
-            st.info(f"Velocità dell'auto vincente: {green_car_speed:.2f}")
-        
         # Save race data based on consent choice
-        # Calculate the sums for red and green car
-        red_car_0s = st.session_state.random_numbers_1.count(0)
-        red_car_1s = st.session_state.random_numbers_1.count(1)
-        green_car_0s = st.session_state.random_numbers_2.count(0)
-        green_car_1s = st.session_state.random_numbers_2.count(1)
+        # Sums for red and green car, counted as the bits came in; lane 0 is green, lane 1 red
+        lane_bits = st.session_state.lane_bits
+        red_car_0s = lane_bits[1].zeros
+        red_car_1s = lane_bits[1].ones
+        green_car_0s = lane_bits[0].zeros
+        green_car_1s = lane_bits[0].ones
 
         # Save race data to Google Sheets
         race_data = [
             "Italian" if st.session_state.language == "Italiano" else "English",
             st.session_state.player_choice,
-            st.session_state.car_pos,
-            st.session_state.car2_pos,
+            float(race.positions[1]),  # Red car
+            float(race.positions[0]),  # Green car
             winner,
             total_time,
             st.session_state.api_key != "",
@@ -546,35 +787,81 @@ def main():
             red_car_1s,
             green_car_0s,
             green_car_1s,
-            st.session_state.car1_moves,  # Number of moves by red car
-            st.session_state.car2_moves,  # Number of moves by green car
+            int(race.moves[1]),  # Number of moves by red car
+            int(race.moves[0]),  # Number of moves by green car
             red_car_speed,  # Speed of the red car
             green_car_speed,  # Speed of the green car
             st.session_state.consent_choice if st.session_state.consent_choice else "",  # Save "Sì" or "No" or blank
-            email  # Save the email if provided
+            email,  # Save the email if provided
+            timing["ticks"],  # Ticks run by the scheduler
+            timing["overruns"],  # Ticks started a full interval or more late
+            timing["skipped_ticks"],  # Ticks dropped to get back on schedule
+            timing["jitter_mean"],  # Mean delay of a tick after its deadline (s)
+            timing["jitter_max"],  # Largest delay of a tick after its deadline (s)
+            green_stats.deviation,  # Green lane hits of the chosen bit above chance
+            green_stats.z_score,
+            green_stats.bayes_factor,  # BF10, uniform prior on the hit rate
+            red_stats.deviation,  # Red lane hits of the other bit above chance
+            red_stats.z_score,
+            red_stats.bayes_factor,
+            race.n_lanes,  # Columns above describe lanes 1 and 2 of the race
         ]
-        save_race_data(sheet1, race_data)
+        save_race_data(results_store, race_data, lane_team(winner_lane))
+        timings.lap("results_submit")
+
+        if st.session_state.race_profiler:
+            result["profile"] = st.session_state.race_profiler.stop()
+            st.session_state.race_profiler = None
+        close_recording()
+        st.session_state.race_result = result
+
+    def show_race_result():
+        """Show the winner of the last race."""
+        result = st.session_state.race_result
+        if result is None:
+            return
+        st.success(result["message"])
+        st.info(f"Velocità dell'auto vincente: {result['speed']:.2f}")
+        if result["profile"]:
+            st.caption(f"Profile saved to {result['profile']}")
+
+    def start_recording():
+        """Start a new raw bit recording for the race about to begin."""
+        close_recording()
+        directory = os.path.join(DATA_DIR, RECORDINGS_DIR)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"race_{time.strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}.bin")
+        st.session_state.race_recorder = RaceRecorder(
+            path, st.session_state.race_slot_size, tick_interval=REQUEST_INTERVAL, move_multiplier=st.session_state.move_multiplier,
+            player_choice=st.session_state.player_choice, exact_threshold=exact_threshold,
+            n_lanes=st.session_state.race.n_lanes,
+        )
 
-        show_retry_popup()
+    def close_recording():
+        """Finish the recording of the current race, if any."""
+        if st.session_state.race_recorder:
+            st.session_state.race_recorder.close()
+            st.session_state.race_recorder = None
 
     def reset_game():
-        """Reset the game state."""
-        st.session_state.car_pos = 50
-        st.session_state.car2_pos = 50
-        st.session_state.car1_moves = 0
-        st.session_state.car2_moves = 0
-        st.session_state.data_for_excel_1 = []
-        st.session_state.data_for_excel_2 = []
-        st.session_state.data_for_condition_1 = []
-        st.session_state.data_for_condition_2 = []
-        st.session_state.random_numbers_1 = []
-        st.session_state.random_numbers_2 = []
+        """Reset the game state and redraw the page."""
+        close_recording()
+        discard_export(st.session_state.pop("export_path", None))
+        st.session_state.race = None
+        st.session_state.lane_bits = [PackedBitLog() for _ in range(n_lanes)]
+        st.session_state.tick_log = TickLog(n_lanes)
+        st.session_state.bit_underruns = 0
+        st.session_state.tick_scheduler = TickScheduler(REQUEST_INTERVAL, TICK_OVERRUN_POLICY)
+        st.session_state.stage_timings = StageTimings()
+        st.session_state.lane_stats = None
         st.session_state.widget_key_counter += 1
         st.session_state.player_choice = None
         st.session_state.running = False
         st.session_state.show_retry_popup = False
-        st.write(reset_game_message)
-        display_cars()
+        st.session_state.race_result = None
+        st.session_state.pending_sounds = []
+        st.session_state.game_reset = True  # Confirmed once on the next run
+        st.rerun()
 
     def show_retry_popup():
         """Show popup asking if the user wants to retry."""
@@ -585,135 +872,182 @@ def main():
             except Exception:
                 pass  # Silence the duplicate widget key exception
 
-    # Connect to Google Sheets
-    sheet1 = configure_google_sheets("test")
+    def run_tick():
+        """Fetch one slot of bits per lane, move the cars and record everything about the tick."""
+        race = st.session_state.race
+        timings = st.session_state.stage_timings
+        timings.start_lap()
+
+        # One fetch fills the packed slots of every lane from the shared random.org or serial pool
+        race_slot_size = st.session_state.race_slot_size
+        packed_slots, random_org_success = get_random_packed_slots(
+            race.n_lanes, race_slot_size, bit_pool, st.session_state.local_rng
+        )
+
+        if bit_pool and not bit_pool.breaker.is_open:
+            # Count slots the pool could not cover instead of stalling the race
+            st.session_state.bit_underruns += 0 if random_org_success else race.n_lanes
+        timings.lap("fetch_bits")
+
+        if not random_org_success:
+            # Only show warning once if random.org fails
+            if not st.session_state.warned_random_org:
+                st.session_state.warned_random_org = True
+
+        # Count ones once on the packed bytes; every later step uses the counts
+        ones = count_ones_packed(packed_slots)
+        timings.lap("count_ones")
+
+        for stats, lane_ones in zip(st.session_state.lane_stats, ones.tolist()):
+            stats.update(lane_ones, race_slot_size)
+        timings.lap("live_stats")
+
+        for log, packed, lane_ones in zip(st.session_state.lane_bits, packed_slots, ones.tolist()):
+            log.append_packed(packed, race_slot_size, lane_ones)
+        if st.session_state.race_recorder:
+            scheduler = st.session_state.tick_scheduler
+            st.session_state.race_recorder.append_packed(
+                packed_slots, scheduler.elapsed(), scheduler.last_lateness, random_org_success,
+                move_multiplier=st.session_state.move_multiplier, exact_threshold=exact_threshold,
+                player_choice=int(race.target_bits[0]),
+            )
+        timings.lap("record_bits")
+
+        # Entropy, threshold and movement of all lanes at once; the sidebar settings apply from this tick
+        race.move_multiplier = st.session_state.move_multiplier
+        race.exact_threshold = exact_threshold
+        entropy, threshold, distance = race.tick(ones)
+        st.session_state.tick_log.append(
+            entropy=entropy, threshold=threshold, distance=distance, position=race.positions
+        )
+        timings.lap("movement")
+
+        # Even lanes are the green team, odd lanes the red one
+        play_sounds(*[name for name, team_distance in (("move_green", distance[0::2]), ("move_red", distance[1::2]))
+                      if team_distance.any()])
 
     if start_button and st.session_state.player_choice is not None:
         st.session_state.running = True
+        targets = lane_targets(st.session_state.player_choice, n_lanes)
+        if race is None or race.slot_size != slot_size or race.n_lanes != n_lanes or race.winner() is not None:
+            # Bits and entropies of another slot size or lane count cannot share the same logs
+            race = st.session_state.race = LaneRace(targets, slot_size)
+            st.session_state.lane_bits = [PackedBitLog() for _ in range(n_lanes)]
+            st.session_state.tick_log = TickLog(n_lanes)
+            new_race = True
+        else:
+            new_race = False
+        if new_race or not np.array_equal(race.target_bits, targets) or not st.session_state.lane_stats:
+            # Hits count against the target bit, so a resume with the other bit starts them again
+            st.session_state.lane_stats = [LaneStatistics(int(target)) for target in targets]
+        race.target_bits = targets  # A stopped race resumes with the bit chosen now
+        st.session_state.race_slot_size = slot_size
         st.session_state.car_start_time = time.time()
+        st.session_state.tick_scheduler = TickScheduler(REQUEST_INTERVAL, TICK_OVERRUN_POLICY)
         st.session_state.show_retry_popup = False
-
-    if stop_button:
-        st.session_state.running = False
-
-    try:
-        while st.session_state.running:
-            start_time = time.time()
-
-            # Get random numbers from random.org
-            random_bits_1, random_org_success_1 = get_random_bits_from_random_org(
-                1000, client
-            )
-            random_bits_2, random_org_success_2 = get_random_bits_from_random_org(
-                1000, client
+        st.session_state.race_result = None
+        if new_race:
+            start_recording()
+        elif st.session_state.race_recorder:
+            # A resumed race keeps its recording, so a replay starts from the same state
+            st.session_state.race_recorder.resume(REQUEST_INTERVAL)
+        if profile_next_race:
+            st.session_state.race_profiler = RaceProfiler(
+                os.path.join(tempfile.gettempdir(), f"race_profile_{int(time.time())}.prof")
             )
+        st.rerun()  # Draw the page again with the race settings locked
 
-            if not random_org_success_1 and not random_org_success_2:
-                # Only show warning once if random.org fails
-                if not st.session_state.warned_random_org:
-                    st.session_state.warned_random_org = True
-
-            st.session_state.random_numbers_1.extend(random_bits_1)
-            st.session_state.random_numbers_2.extend(random_bits_2)
-
-            st.session_state.data_for_excel_1.append(random_bits_1)
-            st.session_state.data_for_excel_2.append(random_bits_2)
-
-            entropy_score_1 = calculate_entropy(random_bits_1)
-            entropy_score_2 = calculate_entropy(random_bits_2)
-
-            st.session_state.data_for_condition_1.append(entropy_score_1)
-            st.session_state.data_for_condition_2.append(entropy_score_2)
-
-            percentile_5_1 = np.percentile(st.session_state.data_for_condition_1, 5)
-            percentile_5_2 = np.percentile(st.session_state.data_for_condition_2, 5)
-
-            count_1 = sum(random_bits_1)
-            count_0 = len(random_bits_1) - count_1
-
-            if entropy_score_1 < percentile_5_1:
-                if st.session_state.player_choice == 1 and count_1 > count_0:
-                    st.session_state.car2_pos = move_car(
-                        st.session_state.car2_pos,
-                        st.session_state.move_multiplier
-                        * (1 + ((percentile_5_1 - entropy_score_1) / percentile_5_1)),
-                    )
-                    st.session_state.car2_moves += 1
-                elif st.session_state.player_choice == 0 and count_0 > count_1:
-                    st.session_state.car2_pos = move_car(
-                        st.session_state.car2_pos,
-                        st.session_state.move_multiplier
-                        * (1 + ((percentile_5_1 - entropy_score_1) / percentile_5_1)),
-                    )
-                    st.session_state.car2_moves += 1
-
-            if entropy_score_2 < percentile_5_2:
-                if st.session_state.player_choice == 1 and count_0 > count_1:
-                    st.session_state.car_pos = move_car(
-                        st.session_state.car_pos,
-                        st.session_state.move_multiplier
-                        * (1 + ((percentile_5_2 - entropy_score_2) / percentile_5_2)),
-                    )
-                    st.session_state.car1_moves += 1
-                elif st.session_state.player_choice == 0 and count_1 > count_0:
-                    st.session_state.car_pos = move_car(
-                        st.session_state.car_pos,
-                        st.session_state.move_multiplier
-                        * (1 + ((percentile_5_2 - entropy_score_2) / percentile_5_2)),
-                    )
-                    st.session_state.car1_moves += 1
+    if stop_button and st.session_state.running:
+        st.session_state.running = False  # The recording stays open in case the race resumes
+        if st.session_state.race_profiler:
+            st.session_state.race_profiler.stop()
+            st.session_state.race_profiler = None
+        st.rerun()  # Draw the page again with the race settings unlocked
 
-            update_car_positions()
-
-            winner = check_winner()
-            if winner:
-                end_race(winner)
-                break
+    if reset_button:
+        reset_game()
 
-            time_elapsed = time.time() - start_time
-            time.sleep(max(REQUEST_INTERVAL - time_elapsed, 0))
+    if st.session_state.pop("game_reset", False):
+        st.write(reset_game_message)
 
-        if st.session_state.show_retry_popup:
-            show_retry_popup()
+    if DELTA_RENDERING:
+        draw_lanes()  # Once per full run; the ticks only move the cars with CSS
 
-    except Exception as e:
-        st.error(str(e))  # Mostra l'errore se c'è un problema
+    @st.fragment(run_every=REQUEST_INTERVAL if st.session_state.running else None)
+    def race_area():
+        """The part of the page a race changes.
 
-    if download_button:
-        # Create DataFrame with "Green Car" and "Red Car" columns and include the chosen bits
-        df = pd.DataFrame(
-            {
-                "Green Car": [
-                    "".join(map(str, row))
-                    for row in st.session_state.data_for_excel_2
-                ],
-                "Red Car": [
-                    "".join(map(str, row))
-                    for row in st.session_state.data_for_excel_1
-                ],
-                "Green Car Bit Chosen": [st.session_state.player_choice] * len(st.session_state.data_for_excel_2),
-                "Red Car Bit Chosen": [1 - st.session_state.player_choice] * len(st.session_state.data_for_excel_1)
-            }
+        While a race runs, the browser reruns only this function every
+        REQUEST_INTERVAL, and each rerun runs the ticks that are due. Between
+        ticks no script runs at all, so the buttons of the page answer at once.
+        """
+        if st.session_state.running:
+            profiler = st.session_state.race_profiler
+            try:
+                # Each run is on a new script thread, which cProfile must be enabled on
+                with profiler.capture() if profiler else nullcontext():
+                    for _ in range(st.session_state.tick_scheduler.poll()):
+                        run_tick()
+                        winner_lane = st.session_state.race.winner()
+                        if winner_lane is not None:
+                            end_race(winner_lane)
+                            st.rerun()  # The whole page: stop the timer and show the outcome
+            except Exception as e:
+                st.error(str(e))  # Mostra l'errore se c'è un problema
+            timings = st.session_state.stage_timings
+            timings.start_lap()
+            update_car_positions()
+            flush_sounds()
+            show_live_stats_values()
+            timings.lap("render")
+        else:
+            update_car_positions()
+            flush_sounds()
+            show_live_stats_values()
+
+    @st.fragment(run_every=LIVE_CHART_INTERVAL if st.session_state.running and show_live_stats else None)
+    def live_stats_chart():
+        """Recent deviation of every lane, on a slower timer of its own so the ticks only send the caption."""
+        if not show_live_stats or not st.session_state.lane_stats:
+            return
+        lanes = st.session_state.lane_stats
+        st.line_chart(
+            {lane_label(lane, len(lanes)): stats.trace[-LIVE_CHART_TICKS:].tolist() for lane, stats in enumerate(lanes)},
+            height=150,
         )
-        
-        # Salva il DataFrame in un buffer in memoria
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
 
-        # Imposta la posizione del buffer all'inizio
-        buffer.seek(0)
+    race_area()
+    live_stats_chart()
+    show_race_result()
+    show_retry_popup()
+
+    if download_button:
+        # Stream the bits and per-tick columns to a temporary file in chunks
+        file_name, mime = EXPORT_FORMATS[export_format]
+        from race_export import export_race  # Loads pandas, only when exporting
+
+        discard_export(st.session_state.pop("export_path", None))
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_name)[1], delete=False) as export_file:
+            export_race(
+                export_file, export_format, st.session_state.lane_bits, st.session_state.tick_log,
+                st.session_state.player_choice,
+            )
+        st.session_state.export_path = export_file.name
 
-        # Genera il bottone per il download
+        # Genera il bottone per il download; the file is read from disk only when it is clicked
         st.download_button(
             label=download_data_text,
-            data=buffer,
-            file_name="random_numbers.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            data=deferred_export(export_file.name),
+            file_name=file_name,
+            mime=mime,
         )
-
-    if reset_button:
-        reset_game()
+        if show_diagnostics:
+            timings_placeholder.download_button(
+                label="Stage timings (JSON)",
+                data=json.dumps(st.session_state.stage_timings.to_dict()),
+                file_name="stage_timings.json",
+                mime="application/json",
+            )
 
 if __name__ == "__main__":
     main()
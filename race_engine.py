@@ -0,0 +1,374 @@
+import bisect
+import math
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def entropy_table(slot_size):
+    """Shannon entropy of a slot of slot_size bits indexed by its number of ones."""
+    counts = np.arange(slot_size + 1)
+    p1 = counts / slot_size
+    p0 = (slot_size - counts) / slot_size
+    with np.errstate(divide="ignore", invalid="ignore"):
+        term_0 = np.where(p0 > 0, p0 * np.log2(p0), 0.0)
+        term_1 = np.where(p1 > 0, p1 * np.log2(p1), 0.0)
+    table = -(term_0 + term_1)
+    table.flags.writeable = False
+    return table
+
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+POPCOUNT.flags.writeable = False
+
+
+def count_ones_packed(packed):
+    """Number of ones in each row of np.packbits output, counted with a byte lookup table."""
+    packed = np.asarray(packed, dtype=np.uint8)
+    return POPCOUNT[packed].sum(axis=-1, dtype=np.int64)
+
+
+@lru_cache(maxsize=None)
+def null_entropy_percentile(slot_size, q=5):
+    """Exact q-th percentile of the slot entropy when every bit is a fair coin flip.
+
+    The number of ones follows Binomial(slot_size, 1/2), so the cut-off is known
+    before the race starts and needs no warm-up history.
+    """
+    log_half = slot_size * math.log(0.5)
+    log_pmf = np.array([
+        math.lgamma(slot_size + 1) - math.lgamma(k + 1) - math.lgamma(slot_size - k + 1) + log_half
+        for k in range(slot_size + 1)
+    ])
+    entropies = entropy_table(slot_size)
+    order = np.argsort(entropies, kind="stable")
+    cdf = np.cumsum(np.exp(log_pmf[order]))
+    return float(entropies[order][np.searchsorted(cdf, q / 100)])
+
+
+class RunningPercentile:
+    """Running percentile of a growing sample, identical to np.percentile with linear interpolation.
+
+    Values are kept in a sorted list updated by bisection, so each tick costs one
+    insertion instead of re-sorting the whole entropy history.
+    """
+
+    def __init__(self, q=5):
+        self.q = q
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def add(self, value):
+        """Insert a new observation."""
+        bisect.insort(self._sorted, float(value))
+
+    def value(self):
+        """Return the q-th percentile of the observations seen so far."""
+        if not self._sorted:
+            raise ValueError("percentile of an empty sample")
+        # Same virtual index and lerp as numpy's "linear" method, so results match bit for bit
+        virtual_index = (self.q / 100) * (len(self._sorted) - 1)
+        below = int(virtual_index)
+        above = min(below + 1, len(self._sorted) - 1)
+        t = virtual_index - below
+        a, b = self._sorted[below], self._sorted[above]
+        diff = b - a
+        if t >= 0.5:
+            return b - diff * (1 - t)
+        return a + diff * t
+
+
+class LevelPercentiles:
+    """Running q-th percentile for many races at once when every value is one of a few levels.
+
+    Slot entropies only take the values of entropy_table, so each race keeps a
+    histogram over the sorted levels. The result is identical to RunningPercentile
+    and np.percentile, but one call advances every race by one tick.
+
+    The percentile interpolates between the values of two ranks. For each of
+    them every race keeps a pointer to the level holding that rank and the number
+    of values below that level. A new value moves the pointers by a level or so,
+    so a tick costs a few vector operations instead of a pass over the histogram.
+    Dropped races keep their histogram rows until half of the rows are unused.
+    """
+
+    def __init__(self, levels, n_races, q=5):
+        self.levels = np.asarray(levels)  # Sorted ascending
+        self.q = q
+        self.counts = np.zeros((n_races, len(self.levels)), dtype=np.int32)
+        self._rows = np.arange(n_races)  # Row of counts of every race still kept
+        self.n = 0
+        self._level = np.zeros((2, n_races), dtype=np.intp)  # Level holding each rank
+        self._below = np.zeros((2, n_races), dtype=np.int64)  # Values at lower levels
+
+    def add(self, level_index):
+        """Add one value per race, given as indexes into levels."""
+        level_index = np.asarray(level_index)
+        self.counts[self._rows, level_index] += 1
+        if not self.n:
+            self._level[:] = level_index
+        self._below += level_index < self._level
+        old_ranks = self._ranks() if self.n else (0, 0)
+        self.n += 1
+        for pointer, (old_rank, rank) in enumerate(zip(old_ranks, self._ranks())):
+            self._move(pointer, rank, rank > old_rank)
+
+    def keep(self, mask):
+        """Drop the races where mask is False, e.g. once they have finished."""
+        self._rows = self._rows[mask]
+        if len(self._rows) < len(self.counts) // 2:
+            self.counts = self.counts[self._rows]
+            self._rows = np.arange(len(self._rows))
+        self._level = self._level[:, mask]
+        self._below = self._below[:, mask]
+
+    def _ranks(self):
+        """The two 0-based ranks the percentile interpolates between, as np.percentile picks them."""
+        virtual_index = (self.q / 100) * (self.n - 1)
+        below = int(virtual_index)
+        return below, min(below + 1, self.n - 1)
+
+    def _move(self, pointer, rank, rank_grew):
+        """Move one pointer of every race to the level holding the given rank.
+
+        A value added below the pointer can only move it down. It can only move
+        up when the rank grew, so most ticks skip reading the histogram.
+        """
+        level, below = self._level[pointer], self._below[pointer]
+        rows = self._rows
+        moving = np.flatnonzero(below > rank)
+        while len(moving):
+            level[moving] -= 1
+            below[moving] -= self.counts[rows[moving], level[moving]]
+            moving = moving[below[moving] > rank]
+        if not rank_grew:
+            return
+        moving = np.flatnonzero(below + self.counts[rows, level] <= rank)
+        while len(moving):
+            below[moving] += self.counts[rows[moving], level[moving]]
+            level[moving] += 1
+            moving = moving[below[moving] + self.counts[rows[moving], level[moving]] <= rank]
+
+    def value(self):
+        """Return the q-th percentile of every race's values so far."""
+        if not self.n:
+            raise ValueError("percentile of an empty sample")
+        virtual_index = (self.q / 100) * (self.n - 1)
+        t = virtual_index - int(virtual_index)
+        a = self.levels[self._level[0]]
+        b = self.levels[self._level[1]]
+        diff = b - a
+        if t >= 0.5:
+            return b - diff * (1 - t)
+        return a + diff * t
+
+
+START_POS = 50  # Starting position of both cars
+TRACK_END = 900  # Shorten the track to leave room for the flag
+
+
+def majority_bit(ones, slot_size):
+    """Most frequent bit of each slot: 1, 0, or -1 on a tie."""
+    ones = np.asarray(ones)
+    return np.where(2 * ones > slot_size, 1, np.where(2 * ones < slot_size, 0, -1))
+
+
+def move_distances(entropy, threshold, majority, target_bit, move_multiplier):
+    """Distance a car moves on each tick, 0 when it does not move.
+
+    The car moves when the slot entropy is below the threshold and its target bit
+    is the most frequent one; the distance is
+    Multiplier × (1 + ((percentile - entropy) / percentile)).
+    """
+    entropy = np.asarray(entropy, dtype=float)
+    threshold = np.asarray(threshold, dtype=float)
+    moves = (entropy < threshold) & (np.asarray(majority) == target_bit)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = move_multiplier * (1 + ((threshold - entropy) / threshold))
+    return np.where(moves, distance, 0.0)
+
+
+def lane_targets(player_choice, n_lanes):
+    """Target bit of every lane: even lanes are the green team with the player's bit, odd lanes the red team."""
+    return np.where(np.arange(n_lanes) % 2 == 0, player_choice, 1 - player_choice)
+
+
+class LaneRace:
+    """A race of any number of cars, each driven by its own slot of bits.
+
+    Every tick takes the number of ones of all slots at once, and entropy,
+    threshold and movement are computed for all lanes together, so the cost of
+    a tick barely grows with the number of lanes. Each lane compares its target
+    bit with the majority of its own slot; shared_majority=True makes every lane
+    use slot 1's majority instead, as races recorded before N lanes did.
+    """
+
+    def __init__(self, target_bits, slot_size, move_multiplier=50, exact_threshold=False,
+                 shared_majority=False, start_pos=START_POS, track_end=TRACK_END):
+        self.target_bits = np.asarray(target_bits)
+        self.n_lanes = len(self.target_bits)
+        self.slot_size = slot_size
+        self.move_multiplier = move_multiplier
+        self.exact_threshold = exact_threshold
+        self.shared_majority = shared_majority
+        self.track_end = track_end
+        self.table = entropy_table(slot_size)
+        levels = np.unique(self.table)
+        self._level_of_count = np.searchsorted(levels, self.table)
+        self.percentiles = LevelPercentiles(levels, self.n_lanes, 5)
+        self.positions = np.full(self.n_lanes, float(start_pos))
+        self.moves = np.zeros(self.n_lanes, dtype=np.int64)
+        self.ticks = 0
+
+    def tick(self, ones):
+        """Advance every lane by one tick from its slot's number of ones.
+
+        Returns the per-lane entropy, threshold and distance moved.
+        """
+        ones = np.asarray(ones)
+        entropy = self.table[ones]
+        # The empirical history is kept even with the exact threshold, so switching back needs no warm-up
+        self.percentiles.add(self._level_of_count[ones])
+        if self.exact_threshold:
+            threshold = np.full(self.n_lanes, null_entropy_percentile(self.slot_size, 5))
+        else:
+            threshold = self.percentiles.value()
+        majority = majority_bit(ones[0] if self.shared_majority else ones, self.slot_size)
+        distance = move_distances(entropy, threshold, majority, self.target_bits, self.move_multiplier)
+        self.positions = np.minimum(self.positions + distance, self.track_end)
+        self.moves += distance > 0
+        self.ticks += 1
+        return entropy, threshold, distance
+
+    def keep(self, mask):
+        """Drop the lanes where mask is False, e.g. the races of a batch that have finished."""
+        self.target_bits = self.target_bits[mask]
+        self.positions = self.positions[mask]
+        self.moves = self.moves[mask]
+        self.percentiles.keep(mask)
+        self.n_lanes = len(self.target_bits)
+
+    def winner(self):
+        """Index of the winning lane, or None; on a tie the red team wins, as in the two-car game."""
+        finished = np.flatnonzero(self.positions >= self.track_end)
+        if not len(finished):
+            return None
+        red = finished[finished % 2 == 1]
+        return int(red[0] if len(red) else finished[0])
+
+
+def running_percentiles(values, q=5):
+    """Threshold seen at each tick: the q-th percentile of all values up to and including it."""
+    tracker = RunningPercentile(q)
+    thresholds = np.empty(len(values))
+    for i, value in enumerate(values):
+        tracker.add(value)
+        thresholds[i] = tracker.value()
+    return thresholds
+
+
+def simulate_race(bits_1, bits_2, player_choice, move_multiplier, exact_threshold=False,
+                  car_pos=START_POS, car2_pos=START_POS):
+    """Replay a whole race from two (ticks × bits) matrices without Streamlit.
+
+    Slot 1 drives the green car (the player's bit) and slot 2 drives the red car
+    (the other bit), with the rules of lanes 1 and 2 of a LaneRace, but every
+    tick is computed at once. Ticks after the winning one are dropped. Returns a
+    dict of per-tick arrays plus the final outcome.
+    """
+    bits_1 = np.asarray(bits_1)
+    bits_2 = np.asarray(bits_2)
+    slot_size = bits_1.shape[1]
+    ones_1 = np.count_nonzero(bits_1, axis=1)
+    ones_2 = np.count_nonzero(bits_2, axis=1)
+    table = entropy_table(slot_size)
+    entropy_1 = table[ones_1]
+    entropy_2 = table[ones_2]
+    if exact_threshold:
+        threshold_1 = threshold_2 = np.full(len(entropy_1), null_entropy_percentile(slot_size, 5))
+    else:
+        threshold_1 = running_percentiles(entropy_1, 5)
+        threshold_2 = running_percentiles(entropy_2, 5)
+
+    green_distance = move_distances(entropy_1, threshold_1, majority_bit(ones_1, slot_size), player_choice,
+                                    move_multiplier)
+    red_distance = move_distances(entropy_2, threshold_2, majority_bit(ones_2, slot_size), 1 - player_choice,
+                                  move_multiplier)
+
+    # Moves are never negative, so clamping the running sum equals clamping at every step;
+    # the start position leads the sum so rounding matches LaneRace's repeated additions
+    red_pos = np.minimum(np.cumsum(np.concatenate(([car_pos], red_distance)))[1:], TRACK_END)
+    green_pos = np.minimum(np.cumsum(np.concatenate(([car2_pos], green_distance)))[1:], TRACK_END)
+
+    finished = np.flatnonzero((red_pos >= TRACK_END) | (green_pos >= TRACK_END))
+    winner = None
+    ticks = len(entropy_1)
+    if len(finished):
+        ticks = finished[0] + 1
+        winner = "red" if red_pos[finished[0]] >= TRACK_END else "green"
+
+    return {
+        "entropy_1": entropy_1[:ticks],
+        "entropy_2": entropy_2[:ticks],
+        "threshold_1": threshold_1[:ticks],
+        "threshold_2": threshold_2[:ticks],
+        "green_distance": green_distance[:ticks],
+        "red_distance": red_distance[:ticks],
+        "car_pos": red_pos[:ticks],
+        "car2_pos": green_pos[:ticks],
+        "car1_moves": int(np.count_nonzero(red_distance[:ticks])),
+        "car2_moves": int(np.count_nonzero(green_distance[:ticks])),
+        "winner": winner,
+        "ticks": int(ticks),
+    }
+
+
+def simulate_null_races(n_races, move_multiplier, rng, slot_size=1000, player_choice=1,
+                        exact_threshold=False, track_end=TRACK_END, max_ticks=100_000):
+    """Run n_races races side by side with fair random bits, one tick for all of them at a time.
+
+    Under the null hypothesis only the number of ones in each slot matters, so it is
+    drawn directly from Binomial(slot_size, 1/2). All races are lanes of one
+    LaneRace, green and red in turn, so the movement and winner rules are those of
+    the game; races that reach max_ticks are returned as unfinished.
+    """
+    race = LaneRace(lane_targets(player_choice, 2 * n_races), slot_size, move_multiplier, exact_threshold,
+                    track_end=track_end)
+    ticks = np.full(n_races, max_ticks, dtype=np.int32)
+    car1_moves = np.zeros(n_races, dtype=np.int32)
+    car2_moves = np.zeros(n_races, dtype=np.int32)
+    finished = np.zeros(n_races, dtype=bool)
+    green_won = np.zeros(n_races, dtype=bool)
+    running = np.arange(n_races)  # Original index of every race still running
+
+    for tick in range(1, max_ticks + 1):
+        race.tick(rng.binomial(slot_size, 0.5, size=race.n_lanes))
+        positions = race.positions.reshape(-1, 2)  # Green, red
+        red_done = positions[:, 1] >= track_end
+        done = red_done | (positions[:, 0] >= track_end)
+        if done.any():
+            ended = running[done]
+            moves = race.moves.reshape(-1, 2)[done]
+            ticks[ended] = tick
+            finished[ended] = True
+            green_won[ended] = ~red_done[done]
+            car1_moves[ended] = moves[:, 1]
+            car2_moves[ended] = moves[:, 0]
+            running = running[~done]
+            race.keep(np.repeat(~done, 2))
+            if not len(running):
+                break
+
+    # Races cut off at max_ticks keep the moves they made so far
+    moves = race.moves.reshape(-1, 2)
+    car1_moves[running] = moves[:, 1]
+    car2_moves[running] = moves[:, 0]
+    return {
+        "ticks": ticks,
+        "car1_moves": car1_moves,
+        "car2_moves": car2_moves,
+        "finished": finished,
+        "green_won": green_won,
+    }
@@ -0,0 +1,193 @@
+import csv
+import importlib.util
+import io
+import numpy as np
+
+TICK_FIELDS = ("entropy", "threshold", "distance", "position")
+# Column, field and lane of the two-car exports, kept as they were; lane 0 is the green car
+TWO_LANE_TICK_COLUMNS = (
+    ("Entropy 1", "entropy", 0), ("Entropy 2", "entropy", 1),
+    ("Threshold 1", "threshold", 0), ("Threshold 2", "threshold", 1),
+    ("Green Move", "distance", 0), ("Red Move", "distance", 1),
+    ("Red Car Position", "position", 1), ("Green Car Position", "position", 0),
+)
+TICK_LABELS = {"entropy": "Entropy", "threshold": "Threshold", "distance": "Move", "position": "Position"}
+EXPORT_CHUNK_BITS = 1_000_000  # Bits converted to text at a time
+XLSX_MAX_CELL = 32_767  # Longest string an Excel cell holds
+
+
+class TickLog:
+    """Growable per-tick record of every lane's entropy, threshold, movement and position."""
+
+    def __init__(self, n_lanes=2, initial_ticks=64):
+        self.n_lanes = n_lanes
+        self._data = np.zeros(initial_ticks, dtype=[(name, "f8", (n_lanes,)) for name in TICK_FIELDS])
+        self.ticks = 0
+
+    def __len__(self):
+        return self.ticks
+
+    def append(self, **values):
+        """Record one tick of per-lane values; fields not given are stored as 0."""
+        if self.ticks == len(self._data):
+            grown = np.zeros(2 * len(self._data), dtype=self._data.dtype)
+            grown[:self.ticks] = self._data
+            self._data = grown
+        self._data[self.ticks] = tuple(values.get(name, 0.0) for name in TICK_FIELDS)
+        self.ticks += 1
+
+    def columns(self, start=0, stop=None):
+        """Ticks start:stop as a dict of (ticks × lanes) float arrays keyed by field name."""
+        rows = self._data[:self.ticks][start:stop]
+        return {name: rows[name] for name in TICK_FIELDS}
+
+
+def bits_to_strings(bits):
+    """Turn a (ticks × bits) 0/1 matrix into one '0101…' string per tick without a Python loop."""
+    bits = np.ascontiguousarray(bits, dtype=np.uint8)
+    if not bits.size:
+        return [""] * len(bits)
+    return np.char.decode((bits + ord("0")).view(f"S{bits.shape[1]}").ravel(), "ascii").tolist()
+
+
+def bit_columns(n_lanes, player_choice):
+    """(column, lane, chosen-bit column, chosen bit) of every lane's bits."""
+    other_choice = None if player_choice is None else 1 - player_choice
+    if n_lanes == 2:
+        # Lane 0 is the green car here as everywhere else; exports made before this were swapped,
+        # with Green Car holding lane 1's bits and Red Car lane 0's
+        return [("Green Car", 0, "Green Car Bit Chosen", player_choice),
+                ("Red Car", 1, "Red Car Bit Chosen", other_choice)]
+    return [(f"Lane {lane + 1}", lane, f"Lane {lane + 1} Bit Chosen",
+             player_choice if lane % 2 == 0 else other_choice) for lane in range(n_lanes)]
+
+
+def tick_columns(n_lanes):
+    """(column, field, lane) of the per-tick columns."""
+    if n_lanes == 2:
+        return TWO_LANE_TICK_COLUMNS
+    return [(f"{TICK_LABELS[name]} {lane + 1}", name, lane) for name in TICK_FIELDS for lane in range(n_lanes)]
+
+
+def iter_export_chunks(lane_bits, tick_log, player_choice, chunk_bits=EXPORT_CHUNK_BITS):
+    """Yield the export table as DataFrames of about chunk_bits bits per lane.
+
+    lane_bits holds one PackedBitLog per lane, slot 1 first; the per-tick columns
+    come from tick_log. Only one chunk of bit strings exists in memory at a time,
+    whatever the slot size.
+    """
+    import pandas as pd  # Deferred so the page can render without loading pandas
+
+    chunk_ticks = max(1, chunk_bits // (lane_bits[0].slot_size or 1))
+    ticks = min(len(bits) for bits in lane_bits)
+    if tick_log is not None:
+        ticks = min(ticks, len(tick_log))
+    for start in range(0, ticks, chunk_ticks):
+        stop = min(start + chunk_ticks, ticks)
+        chunk = {}
+        for column, lane, _, _ in bit_columns(len(lane_bits), player_choice):
+            chunk[column] = bits_to_strings(lane_bits[lane].unpack(start, stop))
+        for _, _, column, bit in bit_columns(len(lane_bits), player_choice):
+            chunk[column] = [bit] * (stop - start)
+        if tick_log is not None:
+            values = tick_log.columns(start, stop)
+            chunk.update({column: values[name][:, lane] for column, name, lane in tick_columns(tick_log.n_lanes)})
+        yield pd.DataFrame(chunk)
+
+
+def write_csv(chunks, file):
+    """Write chunks as CSV to a binary file."""
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    for i, df in enumerate(chunks):
+        df.to_csv(text, header=i == 0, index=False, quoting=csv.QUOTE_MINIMAL)
+    text.flush()
+    text.detach()
+
+
+def write_xlsx(chunks, file):
+    """Write chunks to an .xlsx workbook row by row in xlsxwriter's constant-memory mode.
+
+    Slots longer than XLSX_MAX_CELL bits do not fit in a cell; use another format.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(file, {"constant_memory": True})
+    worksheet = workbook.add_worksheet()
+    row = 0
+    for df in chunks:
+        if row == 0:
+            worksheet.write_row(0, 0, df.columns)
+            row = 1
+        for values in df.itertuples(index=False):
+            worksheet.write_row(row, 0, ["" if v is None else v for v in values])
+            row += 1
+    workbook.close()
+
+
+def write_parquet(chunks, file):
+    """Write chunks as row groups of one Parquet file (needs pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    for df in chunks:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(file, table.schema)
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+
+
+def write_packed(lane_bits, tick_log, player_choice, file):
+    """Save the raw packed bits and per-tick columns as .npz, with no text conversion at all.
+
+    np.unpackbits(data["bits_1"], axis=1, count=data["slot_size"]) restores the bits
+    of slot 1; the per-tick arrays have one column per lane.
+    """
+    arrays = {f"bits_{lane + 1}": bits.packed() for lane, bits in enumerate(lane_bits)}
+    arrays.update({
+        "n_lanes": np.int64(len(lane_bits)),
+        "slot_size": np.int64(lane_bits[0].slot_size or 0),
+        "player_choice": np.int64(-1 if player_choice is None else player_choice),
+    })
+    if tick_log is not None:
+        arrays.update(tick_log.columns())
+    np.savez(file, **arrays)
+
+
+EXPORT_FORMATS = {
+    "xlsx": ("random_numbers.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("random_numbers.csv", "text/csv"),
+    "parquet": ("random_numbers.parquet", "application/vnd.apache.parquet"),
+    "npz": ("random_numbers.npz", "application/octet-stream"),
+}
+
+
+def available_formats(slot_size=None):
+    """Export formats whose libraries are installed and that can hold slots of slot_size bits.
+
+    Libraries are looked up without importing them, so this is cheap on every rerun.
+    """
+    formats = []
+    for fmt, module in (("xlsx", "xlsxwriter"), ("csv", None), ("parquet", "pyarrow"), ("npz", None)):
+        if fmt == "xlsx" and slot_size and slot_size > XLSX_MAX_CELL:
+            continue
+        if module and importlib.util.find_spec(module) is None:
+            continue
+        formats.append(fmt)
+    return formats
+
+
+def export_race(file, fmt, lane_bits, tick_log, player_choice, chunk_bits=EXPORT_CHUNK_BITS):
+    """Write the recorded race, one PackedBitLog per lane, to a binary file object in the given format."""
+    if fmt == "npz":
+        write_packed(lane_bits, tick_log, player_choice, file)
+        return
+    writers = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+    if fmt not in writers:
+        raise ValueError(f"unknown export format: {fmt}")
+    slot_size = lane_bits[0].slot_size or 0
+    if fmt == "xlsx" and slot_size > XLSX_MAX_CELL:
+        raise ValueError(f"slots of {slot_size} bits do not fit in an xlsx cell")
+    writers[fmt](iter_export_chunks(lane_bits, tick_log, player_choice, chunk_bits), file)
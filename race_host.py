@@ -0,0 +1,247 @@
+"""Headless host running many races at once as asyncio tasks in one event loop.
+
+All races share one bit source and one results writer. A front end such as the
+Streamlit page only starts, stops and reads races; the ticks run here.
+
+    python race_host.py --races 500 --seconds 30
+"""
+import argparse
+import asyncio
+import itertools
+import threading
+import time
+import numpy as np
+from bit_sources import get_random_packed_slots, spawn_local_generator
+from live_stats import LaneStatistics
+from race_engine import LaneRace, count_ones_packed, lane_targets
+from results_store import FIELD_NAMES
+from tick_scheduler import TickScheduler
+
+TICK_INTERVAL = 0.5  # Seconds between ticks, as in the interactive game
+SLOT_SIZE = 1000  # Bits per slot and tick
+
+
+class RaceState:
+    """One hosted race: the game's LaneRace, ticked on its own TickScheduler.
+
+    Lane 0 is the green car with the player's bit and lane 1 the red car, as in
+    the Streamlit game, so result_row gives the same columns as its race_data.
+    """
+
+    __slots__ = (
+        "race_id", "player_choice", "race", "scheduler", "lane_stats", "ones",
+        "random_org", "winner_lane", "running", "started_at", "finished_at", "task",
+    )
+
+    def __init__(self, race_id, player_choice, move_multiplier=50, exact_threshold=False, n_lanes=2,
+                 slot_size=SLOT_SIZE, interval=TICK_INTERVAL):
+        self.race_id = race_id
+        self.player_choice = player_choice
+        targets = lane_targets(player_choice, n_lanes)
+        self.race = LaneRace(targets, slot_size, move_multiplier, exact_threshold)
+        self.scheduler = TickScheduler(interval)
+        self.lane_stats = [LaneStatistics(int(target)) for target in targets]
+        self.ones = np.zeros(n_lanes, dtype=np.int64)  # Ones of every lane so far
+        self.random_org = False  # Whether any slot came from random.org
+        self.winner_lane = None
+        self.running = True
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def tick(self, packed_slots, from_random_org=False):
+        """Apply one tick of packed slots, one row per lane; returns the winning lane or None."""
+        ones = count_ones_packed(packed_slots)
+        self.ones += ones
+        self.random_org |= from_random_org
+        for stats, lane_ones in zip(self.lane_stats, ones):
+            stats.update(int(lane_ones), self.race.slot_size)
+        self.race.tick(ones)
+        self.winner_lane = self.race.winner()
+        return self.winner_lane
+
+    @property
+    def winner(self):
+        """Winner name as the game stores it in English, or None while nobody has won."""
+        if self.winner_lane is None:
+            return None
+        name = "Green" if self.winner_lane % 2 == 0 else "Red"
+        return name if self.race.n_lanes == 2 else f"{name} {self.winner_lane // 2 + 1}"
+
+    def snapshot(self):
+        """Plain dict of the fields a viewer needs."""
+        return {
+            "race_id": self.race_id,
+            "positions": self.race.positions.tolist(),
+            "moves": self.race.moves.tolist(),
+            "ticks": self.race.ticks,
+            "winner": self.winner,
+            "running": self.running,
+        }
+
+    def result_row(self):
+        """Result row in results_store.FIELD_NAMES order, the columns of the game's race_data.
+
+        A hosted race has no player form, so language, consent and email are blank.
+        """
+        race = self.race
+        total_time = (self.finished_at or time.monotonic()) - self.started_at
+        zeros = race.ticks * race.slot_size - self.ones
+        green_stats, red_stats = self.lane_stats[:2]
+        values = {
+            "language": "",
+            "player_choice": self.player_choice,
+            "red_position": float(race.positions[1]),
+            "green_position": float(race.positions[0]),
+            "winner": self.winner or "",
+            "total_time": total_time,
+            "random_org": self.random_org,
+            "move_multiplier": race.move_multiplier,
+            "red_zeros": int(zeros[1]),
+            "red_ones": int(self.ones[1]),
+            "green_zeros": int(zeros[0]),
+            "green_ones": int(self.ones[0]),
+            "red_moves": int(race.moves[1]),
+            "green_moves": int(race.moves[0]),
+            "red_speed": float(race.positions[1]) / total_time,
+            "green_speed": float(race.positions[0]) / total_time,
+            "consent": "",
+            "email": "",
+            **self.scheduler.stats(),
+            "green_deviation": green_stats.deviation,
+            "green_z_score": green_stats.z_score,
+            "green_bayes_factor": green_stats.bayes_factor,
+            "red_deviation": red_stats.deviation,
+            "red_z_score": red_stats.z_score,
+            "red_bayes_factor": red_stats.bayes_factor,
+            "n_lanes": race.n_lanes,  # Columns above describe lanes 1 and 2 of the race
+        }
+        return [values[name] for name in FIELD_NAMES]
+
+
+class SharedBitSource:
+    """Packed slots from a shared random.org pool, or from one local generator when it cannot cover them."""
+
+    def __init__(self, pool=None, rng=None):
+        self.pool = pool
+        self.rng = rng or spawn_local_generator()
+
+    def take_slots(self, n_slots, slot_size):
+        """Return (packed_slots, from_random_org)."""
+        return get_random_packed_slots(n_slots, slot_size, self.pool, self.rng)
+
+
+class RaceHost:
+    """Run races as asyncio tasks on one event loop, usually in a background thread.
+
+    start_race, stop_race and snapshot can be called from any thread.
+    """
+
+    def __init__(self, bit_source=None, writer=None, interval=TICK_INTERVAL, slot_size=SLOT_SIZE,
+                 max_ticks=None):
+        self.bit_source = bit_source or SharedBitSource()
+        self.writer = writer  # Anything with submit(row), e.g. SheetsWriter
+        self.interval = interval
+        self.slot_size = slot_size
+        self.max_ticks = max_ticks
+        self.races = {}
+        self.finished = 0
+        self.loop = None
+        self._thread = None
+        self._ids = itertools.count(1)
+
+    def start_in_thread(self):
+        """Start the event loop in a daemon thread and return self."""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="race-host", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def start_race(self, player_choice, move_multiplier=50, exact_threshold=False, n_lanes=2):
+        """Create a race and schedule it on the host loop; returns its id."""
+        state = RaceState(next(self._ids), player_choice, move_multiplier, exact_threshold, n_lanes,
+                          self.slot_size, self.interval)
+        self.races[state.race_id] = state
+
+        def schedule():
+            state.task = self.loop.create_task(self._run(state))
+
+        if self._on_loop_thread():
+            schedule()
+        else:
+            self.loop.call_soon_threadsafe(schedule)
+        return state.race_id
+
+    def stop_race(self, race_id):
+        state = self.races.get(race_id)
+        if state:
+            state.running = False
+
+    def snapshot(self, race_id):
+        state = self.races.get(race_id)
+        return state.snapshot() if state else None
+
+    def _on_loop_thread(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    async def _run(self, state):
+        """Tick one race on its scheduler, sleeping on the loop until the next deadline."""
+        scheduler = state.scheduler
+        state.started_at = time.monotonic()
+        while state.running:
+            if not scheduler.poll(early=0):
+                await asyncio.sleep(scheduler.next_deadline - scheduler.clock())
+                continue
+            packed, from_pool = self.bit_source.take_slots(state.race.n_lanes, self.slot_size)
+            if state.tick(packed, from_pool) is not None:
+                break
+            if self.max_ticks and state.race.ticks >= self.max_ticks:
+                break
+
+        state.running = False
+        state.finished_at = time.monotonic()
+        self.finished += 1
+        if self.writer is not None:
+            self.writer.submit(state.result_row())
+
+    async def run_races(self, n_races, move_multiplier=50, exact_threshold=False):
+        """Start n_races races on the current loop and wait for all of them."""
+        self.loop = asyncio.get_running_loop()
+        ids = [self.start_race(i % 2, move_multiplier, exact_threshold) for i in range(n_races)]
+        await asyncio.sleep(0)  # Let the tasks be created
+        await asyncio.gather(*(self.races[i].task for i in ids))
+        return [self.races[i] for i in ids]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--races", type=int, default=500, help="concurrent races")
+    parser.add_argument("--seconds", type=float, default=30, help="stop every race after this long")
+    parser.add_argument("--interval", type=float, default=TICK_INTERVAL)
+    parser.add_argument("--multiplier", type=float, default=50)
+    args = parser.parse_args(argv)
+
+    host = RaceHost(interval=args.interval, max_ticks=int(args.seconds / args.interval))
+    start_cpu, start = time.process_time(), time.perf_counter()
+    races = asyncio.run(host.run_races(args.races, args.multiplier))
+    wall, cpu = time.perf_counter() - start, time.process_time() - start_cpu
+    ticks = sum(r.race.ticks for r in races)
+    overruns = sum(r.scheduler.overruns for r in races)
+    winners = sum(r.winner is not None for r in races)
+    print(f"{len(races)} races, {winners} finished, {ticks} ticks in {wall:.1f} s wall, "
+          f"{cpu:.1f} s CPU ({cpu / max(ticks, 1) * 1e6:.0f} us CPU per tick), {overruns} overruns")
+
+
+if __name__ == "__main__":
+    main()
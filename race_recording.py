@@ -0,0 +1,267 @@
+"""Raw bit recordings of races in a fixed-layout binary file, and their replay.
+
+A recording is a 64-byte header followed by one fixed-size record per tick:
+
+    header  magic "MINDRACE", version, slot size, bytes per slot, tick count,
+            tick interval, move multiplier, player choice, exact threshold flag,
+            wall-clock start time, number of lanes
+    record  seconds since the first tick (f8), lateness after its deadline (f4),
+            random.org flags (u1, bit i for lane i + 1),
+            settings flags (u1, bit 0 exact threshold, bit 1 player choice),
+            move multiplier (f8),
+            the bits of every lane's slot as np.packbits bytes, slot 1 first
+
+The header holds the settings of the first tick; each record holds those of its
+own tick, since the game applies sidebar changes from the next tick and a race
+stopped and resumed with the other bit keeps its recording.
+
+Version 2 files have no per-tick settings and are replayed with the header's.
+Version 1 files also have no lane count and hold two lanes, which both moved on
+the majority bit of slot 1; they are still read and replayed with that rule.
+
+Files are written and read through mmap, so scanning many recordings never
+copies the bits, and replays need no random.org access.
+
+    python race_recording.py replay race.bin --speed 0
+    python race_recording.py scan recordings/
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+import numpy as np
+from race_engine import LaneRace, count_ones_packed, lane_targets
+
+MAGIC = b"MINDRACE"
+VERSION = 3
+HEADER = struct.Struct("<8sHIIQddbBdH")  # Fields in the order of the module docstring
+HEADER_V1 = struct.Struct("<8sHIIQddbBd")
+HEADER_SIZE = 64
+MAX_LANES = 8  # Lanes the random.org flags byte can hold
+
+
+def record_dtype(row_bytes, n_lanes=2, version=VERSION):
+    fields = [("time", "<f8"), ("lateness", "<f4"), ("random_org", "u1")]
+    if version >= 3:
+        fields += [("settings", "u1"), ("move_multiplier", "<f8")]
+    return np.dtype(fields + [("bits", "u1", (n_lanes, row_bytes))])
+
+
+class RaceRecorder:
+    """Append each tick's packed bits and timing to a memory-mapped recording file.
+
+    The file grows by doubling, and the tick count in the header is updated on
+    every tick, so a recording cut short by a crash is still readable. Settings
+    not given to append_packed are those passed here.
+    """
+
+    def __init__(self, path, slot_size, tick_interval=0.5, move_multiplier=0.0, player_choice=-1,
+                 exact_threshold=False, n_lanes=2, initial_ticks=256):
+        if not 1 <= n_lanes <= MAX_LANES:
+            raise ValueError(f"recordings hold 1 to {MAX_LANES} lanes, not {n_lanes}")
+        self.path = path
+        self.slot_size = slot_size
+        self.n_lanes = n_lanes
+        self.row_bytes = (slot_size + 7) // 8
+        self.dtype = record_dtype(self.row_bytes, n_lanes)
+        self.ticks = 0
+        self.move_multiplier = move_multiplier
+        self.exact_threshold = exact_threshold
+        self.player_choice = player_choice
+        self._time_offset = 0.0
+        self._header = [MAGIC, VERSION, slot_size, self.row_bytes, 0, tick_interval,
+                        float(move_multiplier), -1 if player_choice is None else player_choice,
+                        int(bool(exact_threshold)), time.time(), n_lanes]
+        self._file = open(path, "w+b")
+        self._map_ticks(initial_ticks)
+        self._write_header()
+
+    def _map_ticks(self, capacity):
+        self.capacity = capacity
+        self._file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._records = np.frombuffer(self._mmap, dtype=self.dtype, count=capacity, offset=HEADER_SIZE)
+
+    def _write_header(self):
+        self._header[4] = self.ticks
+        HEADER.pack_into(self._mmap, 0, *self._header)
+
+    def resume(self, gap):
+        """Continue a race stopped after the last tick: elapsed restarts from 0 gap seconds after it."""
+        if self.ticks:
+            self._time_offset = float(self._records[self.ticks - 1]["time"]) + gap
+
+    def append(self, bits, elapsed, lateness=0.0, random_org=False, **settings):
+        """Record one tick of 0/1 bits, a (lanes × slot_size) array."""
+        self.append_packed(np.packbits(np.asarray(bits, dtype=np.uint8), axis=1), elapsed, lateness, random_org,
+                           **settings)
+
+    def append_packed(self, packed, elapsed, lateness=0.0, random_org=False, move_multiplier=None,
+                      exact_threshold=None, player_choice=None):
+        """Record one tick of bits already packed with np.packbits, a (lanes × row_bytes) array.
+
+        random_org is True when every slot came from random.org, or one flag per lane.
+        The settings are those the tick ran with.
+        """
+        if move_multiplier is not None:
+            self.move_multiplier = move_multiplier
+        if exact_threshold is not None:
+            self.exact_threshold = exact_threshold
+        if player_choice is not None:
+            self.player_choice = player_choice
+        if self.ticks == self.capacity:
+            del self._records  # Release the buffer so the map can be closed
+            self._mmap.close()
+            self._map_ticks(2 * self.capacity)
+        record = self._records[self.ticks]
+        record["time"] = self._time_offset + elapsed
+        record["lateness"] = lateness
+        flags = [random_org] * self.n_lanes if np.isscalar(random_org) else random_org
+        record["random_org"] = sum(int(bool(flag)) << lane for lane, flag in enumerate(flags))
+        record["settings"] = int(bool(self.exact_threshold)) | int(self.player_choice == 1) << 1
+        record["move_multiplier"] = self.move_multiplier
+        record["bits"] = packed
+        self.ticks += 1
+        self._write_header()
+
+    def close(self):
+        """Flush and trim the file to the ticks recorded."""
+        if self._file.closed:
+            return
+        self._mmap.flush()
+        del self._records
+        self._mmap.close()
+        self._file.truncate(HEADER_SIZE + self.ticks * self.dtype.itemsize)
+        self._file.close()
+
+
+class RaceRecording:
+    """Read-only memory-mapped view of a recording; records are numpy views, not copies."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version = struct.unpack_from("<8sH", self._mmap, 0)
+        if magic != MAGIC or not 1 <= self.version <= VERSION:
+            raise ValueError(f"{path} is not a version 1 to {VERSION} race recording")
+        if self.version == 1:
+            fields, self.n_lanes = HEADER_V1.unpack_from(self._mmap, 0), 2
+        else:
+            *fields, self.n_lanes = HEADER.unpack_from(self._mmap, 0)
+        (_, _, self.slot_size, self.row_bytes, self.ticks, self.tick_interval,
+         self.move_multiplier, player_choice, exact_threshold, self.started) = fields
+        self.player_choice = None if player_choice < 0 else player_choice
+        self.exact_threshold = bool(exact_threshold)
+        self.shared_majority = self.version == 1
+        # Version 1 stored slot 1 and slot 2 as two fields, the same bytes as a two-lane array
+        self.records = np.frombuffer(self._mmap, dtype=record_dtype(self.row_bytes, self.n_lanes, self.version),
+                                     count=self.ticks, offset=HEADER_SIZE)
+
+    def __len__(self):
+        return self.ticks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        del self.records
+        self._mmap.close()
+        self._file.close()
+
+    def ones(self):
+        """Number of ones per tick and lane as a (lanes × ticks) array, counted on the packed bytes."""
+        return count_ones_packed(self.records["bits"]).T
+
+    def settings(self):
+        """Move multiplier, exact threshold flag and player choice of every tick, as three arrays."""
+        if self.version < 3:
+            return (np.full(self.ticks, self.move_multiplier), np.full(self.ticks, self.exact_threshold),
+                    np.full(self.ticks, -1 if self.player_choice is None else self.player_choice))
+        flags = self.records["settings"]
+        return self.records["move_multiplier"], (flags & 1).astype(bool), (flags >> 1 & 1).astype(int)
+
+    def bits(self, start=0, stop=None):
+        """Ticks start:stop of every lane as a list of (ticks × slot_size) 0/1 arrays, slot 1 first."""
+        records = self.records[start:stop]
+        return [np.unpackbits(records["bits"][:, lane], axis=1, count=self.slot_size)
+                for lane in range(self.n_lanes)]
+
+
+def replay(recording, speed=0.0, on_tick=None, sleep=time.sleep):
+    """Re-run a recorded race through the movement rules and return the final LaneRace.
+
+    speed 0 replays as fast as possible from the counts of ones; speed 1 keeps
+    the recorded tick times, 2 runs twice as fast, and so on. on_tick(race) is
+    called after every tick of a timed replay.
+    """
+    if recording.player_choice is None:
+        raise ValueError("recording has no player choice")
+    race = LaneRace(lane_targets(recording.player_choice, recording.n_lanes), recording.slot_size,
+                    recording.move_multiplier, recording.exact_threshold, recording.shared_majority)
+    start = time.monotonic()
+    settings = zip(*recording.settings())
+    for ones, elapsed, (move_multiplier, exact_threshold, player_choice) in zip(
+            recording.ones().T, recording.records["time"], settings):
+        if speed:
+            delay = elapsed / speed - (time.monotonic() - start)
+            if delay > 0:
+                sleep(delay)
+        # The settings of each tick, as the game applied them
+        race.move_multiplier = float(move_multiplier)
+        race.exact_threshold = bool(exact_threshold)
+        if player_choice >= 0:
+            race.target_bits = lane_targets(player_choice, recording.n_lanes)
+        race.tick(ones)
+        if speed and on_tick:
+            on_tick(race)
+        if race.winner() is not None:
+            break
+    return race
+
+
+def scan(paths):
+    """Yield (path, ticks, ones per lane) for each recording."""
+    for path in paths:
+        with RaceRecording(path) as recording:
+            yield path, len(recording), recording.ones().sum(axis=1).tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay or scan race recordings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="re-run one recording")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=0.0,
+                               help="0 as fast as possible, 1 real time, 2 twice as fast, ...")
+    scan_parser = commands.add_parser("scan", help="count bits in recordings")
+    scan_parser.add_argument("paths", nargs="+", help="recording files or directories")
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        with RaceRecording(args.path) as recording:
+            race = replay(recording, args.speed)
+        winner = race.winner()
+        positions = ", ".join(f"{pos:.1f}" for pos in race.positions)
+        print(f"winner {'none' if winner is None else f'lane {winner + 1}'} after {race.ticks} ticks, "
+              f"positions {positions}")
+        return 0
+
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".bin")))
+        else:
+            paths.append(path)
+    for path, ticks, ones in scan(paths):
+        print(f"{path}: {ticks} ticks, ones per slot {ones}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
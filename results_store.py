@@ -0,0 +1,366 @@
+"""Local SQLite store of race results, with leaderboard and best-time queries.
+
+Rows are the race_data lists the game builds at the end of a race, in the
+order of RESULT_FIELDS. A background thread inserts them in batches into a
+WAL-mode database, so readers never wait for the writer; a batch the database
+refuses is retried, then kept in a spool file and inserted first once it works
+again. When given a sync callable, e.g. SheetsWriter.submit, it also forwards
+every stored row until sync confirms it, so results reach Google Sheets even
+after a crash or restart; a row may then be sent twice, never lost.
+
+    python results_store.py race_results.sqlite3 --fill 300000   # synthetic rows, then time the queries
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from functools import partial
+
+RESULT_FIELDS = (
+    ("language", "TEXT"),
+    ("player_choice", "INTEGER"),
+    ("red_position", "REAL"),
+    ("green_position", "REAL"),
+    ("winner", "TEXT"),
+    ("total_time", "REAL"),
+    ("random_org", "INTEGER"),
+    ("move_multiplier", "REAL"),
+    ("red_zeros", "INTEGER"),
+    ("red_ones", "INTEGER"),
+    ("green_zeros", "INTEGER"),
+    ("green_ones", "INTEGER"),
+    ("red_moves", "INTEGER"),
+    ("green_moves", "INTEGER"),
+    ("red_speed", "REAL"),
+    ("green_speed", "REAL"),
+    ("consent", "TEXT"),
+    ("email", "TEXT"),
+    ("ticks", "INTEGER"),
+    ("overruns", "INTEGER"),
+    ("skipped_ticks", "INTEGER"),
+    ("jitter_mean", "REAL"),
+    ("jitter_max", "REAL"),
+    ("green_deviation", "REAL"),
+    ("green_z_score", "REAL"),
+    ("green_bayes_factor", "REAL"),
+    ("red_deviation", "REAL"),
+    ("red_z_score", "REAL"),
+    ("red_bayes_factor", "REAL"),
+    ("n_lanes", "INTEGER"),
+)
+FIELD_NAMES = tuple(name for name, _ in RESULT_FIELDS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    winner_team TEXT NOT NULL,
+    {", ".join(f"{name} {kind}" for name, kind in RESULT_FIELDS)},
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_results_multiplier ON results (move_multiplier, winner_team, total_time);
+CREATE INDEX IF NOT EXISTS idx_results_player_choice ON results (player_choice, winner_team);
+CREATE INDEX IF NOT EXISTS idx_results_winner ON results (winner_team, total_time);
+CREATE INDEX IF NOT EXISTS idx_results_time ON results (total_time);
+CREATE TABLE IF NOT EXISTS best_times (
+    email TEXT NOT NULL,
+    move_multiplier REAL NOT NULL,
+    total_time REAL NOT NULL,
+    result_id INTEGER NOT NULL,
+    PRIMARY KEY (email, move_multiplier)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_unsynced ON results (id) WHERE synced = 0;
+"""
+
+
+def _plain(value):
+    """Turn numpy scalars into plain Python values sqlite3 accepts."""
+    return value.item() if hasattr(value, "item") else value
+
+
+class ResultsStore:
+    """Race results in SQLite, written in batches from a background thread.
+
+    Wins of the green team, the player's car, count for the leaderboard. The
+    fastest win of every player (by email) and multiplier is kept in best_times
+    as rows are inserted, so best-time queries never scan the results.
+    """
+
+    def __init__(self, path, sync=None, batch_size=100, linger=0.2, max_retries=3, backoff=0.5,
+                 sleep=time.sleep):
+        self.path = path
+        self.spool_path = path + ".spool.jsonl"  # Rows the database refused, inserted first next time
+        # Called with each stored row, in RESULT_FIELDS order, and a callable that confirms it was written
+        self.sync = sync
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.stored_rows = 0
+        self.spooled_rows = 0
+        self.synced_rows = 0
+        self.failures = 0
+        self.last_error = None
+        self._forwarded_id = 0  # Rows up to this id have been handed to sync in this process
+        self._confirmed = queue.SimpleQueue()  # Ids confirmed by sync, marked synced by the worker
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="results-store", daemon=True)
+        self._worker.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes of the app in WAL mode
+        return conn
+
+    def submit(self, row, winner_team):
+        """Queue one race_data row and the team that won ('green' or 'red'); returns immediately."""
+        if len(row) != len(RESULT_FIELDS):
+            raise ValueError(f"expected {len(RESULT_FIELDS)} fields, got {len(row)}")
+        self._queue.put((time.time(), winner_team, *(_plain(v) for v in row)))
+
+    @property
+    def pending_spool(self):
+        """Whether rows are waiting in the spool file."""
+        return os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0
+
+    def flush(self):
+        """Block until every submitted row is stored or spooled (and handed to sync)."""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._closed.set()
+        self._worker.join()
+
+    def _next_batch(self):
+        """Wait for a row, then collect more arriving within linger seconds up to batch_size."""
+        try:
+            rows = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        conn = self._connect()
+        columns = ("created_at", "winner_team") + FIELD_NAMES
+        insert = f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        try:
+            self._sync_pending(conn)
+            while not self._closed.is_set():
+                rows = self._next_batch()
+                self._mark_synced(conn)
+                if rows or self.pending_spool:
+                    self._store(conn, insert, rows)
+                    self._sync_pending(conn)
+                for _ in rows:
+                    self._queue.task_done()
+        finally:
+            self._mark_synced(conn)
+            conn.close()
+
+    def _store(self, conn, insert, rows):
+        """Insert the spooled rows and then rows, retrying with backoff; spool them all if that fails."""
+        spooled = self._read_spool() if self.pending_spool else []
+        rows = spooled + [list(row) for row in rows]
+        for attempt in range(self.max_retries):
+            try:
+                self._insert(conn, insert, rows)
+            except sqlite3.Error as e:
+                self.failures += 1
+                self.last_error = e
+                if attempt + 1 < self.max_retries:
+                    self.sleep(self.backoff * 2 ** attempt)
+                continue
+            if spooled:
+                os.remove(self.spool_path)
+            return
+        self._write_spool(rows)
+        self.spooled_rows += len(rows) - len(spooled)
+
+    def _read_spool(self):
+        with open(self.spool_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _write_spool(self, rows):
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+
+    def _insert(self, conn, insert, rows):
+        """Insert one batch in a single transaction and update the best times it beats."""
+        with conn:
+            first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM results").fetchone()[0]
+            conn.executemany(insert, rows)
+            conn.execute(
+                """
+                INSERT INTO best_times (email, move_multiplier, total_time, result_id)
+                SELECT email, move_multiplier, total_time, id FROM results
+                WHERE id >= ? AND winner_team = 'green' AND email <> '' AND email IS NOT NULL
+                ON CONFLICT (email, move_multiplier) DO UPDATE
+                SET total_time = excluded.total_time, result_id = excluded.result_id
+                WHERE excluded.total_time < best_times.total_time
+                """,
+                (first_id,),
+            )
+        self.stored_rows += len(rows)
+
+    def _sync_pending(self, conn):
+        """Hand every stored row not yet forwarded to sync, oldest first.
+
+        Rows stay synced = 0 until sync confirms them, so after a restart the
+        unconfirmed ones are forwarded again.
+        """
+        if self.sync is None:
+            return
+        while True:
+            try:
+                pending = conn.execute(
+                    f"SELECT id, {', '.join(FIELD_NAMES)} FROM results WHERE synced = 0 AND id > ? "
+                    f"ORDER BY id LIMIT ?",
+                    (self._forwarded_id, self.batch_size),
+                ).fetchall()
+            except sqlite3.Error as e:
+                self.failures += 1
+                self.last_error = e
+                return
+            if not pending:
+                return
+            for row in pending:
+                self.sync(list(row[1:]), partial(self._confirmed.put, row[0]))
+            self._forwarded_id = pending[-1][0]
+
+    def _mark_synced(self, conn):
+        """Mark the rows sync has confirmed since the last call."""
+        ids = []
+        while True:
+            try:
+                ids.append((self._confirmed.get_nowait(),))
+            except queue.Empty:
+                break
+        if not ids:
+            return
+        try:
+            with conn:
+                conn.executemany("UPDATE results SET synced = 1 WHERE id = ?", ids)
+        except sqlite3.Error as e:
+            self.failures += 1
+            self.last_error = e
+            for (row_id,) in ids:
+                self._confirmed.put(row_id)  # Try again on the next batch
+            return
+        self.synced_rows += len(ids)
+
+    def _query(self, sql, params=()):
+        """Run a read query on its own connection; WAL readers never block the writer."""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def leaderboard(self, move_multiplier=None, limit=10):
+        """Fastest wins of the player's car, optionally for one movement multiplier."""
+        where, params = "winner_team = 'green'", []
+        if move_multiplier is not None:
+            where += " AND move_multiplier = ?"
+            params.append(move_multiplier)
+        return self._query(
+            f"SELECT email, total_time, move_multiplier, n_lanes, created_at FROM results "
+            f"WHERE {where} ORDER BY total_time LIMIT ?",
+            (*params, limit),
+        )
+
+    def best_times(self, move_multiplier=None, limit=10):
+        """Each player's fastest win, fastest players first."""
+        if move_multiplier is None:
+            return self._query(
+                "SELECT email, MIN(total_time) AS total_time FROM best_times GROUP BY email "
+                "ORDER BY total_time LIMIT ?",
+                (limit,),
+            )
+        return self._query(
+            "SELECT email, total_time FROM best_times WHERE move_multiplier = ? ORDER BY total_time LIMIT ?",
+            (move_multiplier, limit),
+        )
+
+    def best_time(self, email, move_multiplier=None):
+        """A player's fastest win in seconds, or None."""
+        if move_multiplier is None:
+            rows = self._query("SELECT MIN(total_time) AS total_time FROM best_times WHERE email = ?", (email,))
+        else:
+            rows = self._query(
+                "SELECT total_time FROM best_times WHERE email = ? AND move_multiplier = ?",
+                (email, move_multiplier),
+            )
+        return rows[0]["total_time"] if rows else None
+
+    def count(self):
+        return self._query("SELECT COUNT(*) AS n FROM results")[0]["n"]
+
+
+def fill(store, n_rows, seed=0):
+    """Submit n_rows synthetic results from 1000 players, for sizing and timing the queries."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    for i in range(n_rows):
+        green = bool(rng.integers(2))
+        store.submit(
+            ["English", int(rng.integers(2)), 900.0, 900.0, "Green" if green else "Red",
+             float(rng.gamma(9, 30)), False, float(rng.choice([20, 50, 80])), 0, 0, 0, 0, 0, 0, 0.0, 0.0,
+             "No", f"player{rng.integers(1000)}@example.com", 0, 0, 0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 2],
+            "green" if green else "red",
+        )
+    store.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the leaderboard queries of a results database.")
+    parser.add_argument("path")
+    parser.add_argument("--fill", type=int, default=0, help="first add this many synthetic results")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.path, batch_size=args.batch_size)
+    if args.fill:
+        start = time.perf_counter()
+        fill(store, args.fill)
+        print(f"inserted {args.fill} results in {time.perf_counter() - start:.1f} s")
+    print(f"{store.count()} results in {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB)")
+    for name, query in (
+        ("leaderboard", lambda: store.leaderboard()),
+        ("leaderboard x50", lambda: store.leaderboard(50)),
+        ("best_times", lambda: store.best_times()),
+        ("best_times x50", lambda: store.best_times(50)),
+        ("best_time", lambda: store.best_time("player7@example.com")),
+    ):
+        start = time.perf_counter()
+        for _ in range(20):
+            query()
+        print(f"{name:16} {(time.perf_counter() - start) / 20 * 1e3:8.2f} ms")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Pseudo-terminal stand-in for a USB hardware random number generator.
+
+The emulator opens a pty pair and streams random bytes into it at a fixed rate,
+so SerialBitPool can be run against the slave end exactly as against a real
+device. Like a real device it never waits for the reader: bytes that do not fit
+in the pty buffer are dropped and counted.
+
+    python serial_emulator.py --rate 100000             # print the port and stream until Ctrl+C
+    python serial_emulator.py --rate 100000 --check 10  # race-like reads for 10 s and report
+"""
+import argparse
+import errno
+import os
+import sys
+import threading
+import time
+import tty
+import numpy as np
+from bit_sources import SerialBitPool, spawn_local_generator
+from race_engine import count_ones_packed
+
+
+class PtyRandomStream:
+    """Stream rate bytes per second of random data into a new pseudo-terminal."""
+
+    def __init__(self, rate=100_000, chunk_interval=0.01, rng=None):
+        self.rate = rate
+        self.chunk_interval = chunk_interval  # Seconds between writes
+        self.rng = rng or spawn_local_generator()
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # Pass bytes through unchanged, no echo or newline translation
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self.written_bytes = 0
+        self.dropped_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pty-rng", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _run(self):
+        """Write on absolute deadlines so the rate holds however long each write takes."""
+        start = time.monotonic()
+        sent = 0
+        while not self._stop.is_set():
+            due = int((time.monotonic() - start) * self.rate) - sent
+            if due > 0:
+                data = self.rng.integers(0, 256, size=due, dtype=np.uint8).tobytes()
+                try:
+                    written = os.write(self._master, data)
+                except BlockingIOError:
+                    written = 0
+                except OSError as e:
+                    if e.errno != errno.EIO:
+                        raise
+                    written = 0  # Nobody has the port open
+                self.written_bytes += written
+                self.dropped_bytes += due - written
+                sent += due
+            self._stop.wait(self.chunk_interval)
+
+
+def check(rate, seconds, slot_size=1000, n_lanes=2, interval=0.5):
+    """Take n_lanes slots every interval seconds from a SerialBitPool on an emulated device."""
+    stream = PtyRandomStream(rate).start()
+    pool = SerialBitPool(stream.port)
+    ones = slots = 0
+    try:
+        deadline = time.monotonic()
+        end = deadline + seconds
+        while deadline < end:
+            deadline += interval
+            time.sleep(max(deadline - time.monotonic(), 0))
+            packed = pool.take_packed_slots(n_lanes, slot_size)
+            if packed is not None:
+                ones += int(count_ones_packed(packed).sum())
+                slots += n_lanes
+        stats = pool.stats()
+    finally:
+        pool.close()
+        stream.stop()
+    needed = n_lanes * slot_size / interval
+    print(f"port {stream.port}: device {rate * 8:,.0f} bit/s, race needs {needed:,.0f} bit/s")
+    print(f"received {stats['fetched_bits']:,} bits at {stats['throughput_bps']:,.0f} bit/s sustained, "
+          f"{stats['dropped_bits']:,} dropped as stale, {stream.dropped_bytes * 8:,} dropped by the device")
+    print(f"{slots} slots taken, {stats['underruns']} underruns, {stats['fetch_errors']} read errors, "
+          f"ones {ones / max(slots * slot_size, 1):.4f}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=100_000, help="bytes per second")
+    parser.add_argument("--check", type=float, metavar="SECONDS",
+                        help="read race-sized slots from the emulator for this long and report")
+    parser.add_argument("--slot-size", type=int, default=1000)
+    parser.add_argument("--lanes", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        stats = check(args.rate, args.check, args.slot_size, args.lanes)
+        return 1 if stats["underruns"] else 0
+
+    stream = PtyRandomStream(args.rate).start()
+    print(f"streaming {args.rate} bytes/s on {stream.port}; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+def _plain(value):
+    """Turn numpy scalars into plain Python values that JSON and gspread accept."""
+    return value.item() if hasattr(value, "item") else value
+
+
+class SheetsWriter:
+    """Append result rows to a worksheet from a background thread.
+
+    Rows submitted close together are sent as one append_rows call. A batch that
+    still fails after max_retries attempts with exponential backoff goes to an
+    append-only JSON-lines spool file, which is sent first once the worksheet
+    answers again, so rows keep their order and survive restarts.
+    """
+
+    def __init__(self, connect, spool_path, batch_size=50, linger=0.5, max_retries=3,
+                 backoff=1.0, max_backoff=60.0, spool_retry_interval=30.0, sleep=time.sleep):
+        self.connect = connect  # Returns the worksheet; called lazily from the worker
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.spool_retry_interval = spool_retry_interval
+        self.sleep = sleep
+        self.written_rows = 0
+        self.spooled_rows = 0
+        self.failures = 0
+        self.last_error = None
+        self._worksheet = None
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._last_spool_attempt = 0.0
+        self._worker = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+        self._worker.start()
+
+    def submit(self, row, done=None):
+        """Queue one row; returns immediately. done() is called once the row is written or spooled."""
+        self._queue.put(([_plain(v) for v in row], done))
+
+    def flush(self):
+        """Block until every submitted row has been written or spooled."""
+        self._queue.join()
+
+    def close(self):
+        """Write or spool what is queued and stop the worker."""
+        self.flush()
+        self._closed.set()
+        self._worker.join()
+
+    @property
+    def pending_spool(self):
+        """Whether rows are waiting in the spool file."""
+        return os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0
+
+    def _next_batch(self):
+        """Wait for a row, then collect more arriving within linger seconds up to batch_size."""
+        try:
+            rows = [self._queue.get(timeout=min(self.linger, 1.0) if self.linger else 1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._closed.is_set():
+            items = self._next_batch()
+            rows = [row for row, _ in items]
+            if self.pending_spool and (
+                rows or time.monotonic() - self._last_spool_attempt >= self.spool_retry_interval
+            ):
+                self._flush_spool()
+            if not rows:
+                continue
+            if self.pending_spool or not self._send(rows):
+                # Keep the order: nothing bypasses rows already in the spool
+                self._spool(rows)
+            for _, done in items:
+                if done is not None:
+                    done()
+                self._queue.task_done()
+
+    def _send(self, rows):
+        """Try to append rows, retrying with exponential backoff; True on success."""
+        for attempt in range(self.max_retries):
+            try:
+                if self._worksheet is None:
+                    self._worksheet = self.connect()
+                self._worksheet.append_rows(rows)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                if attempt + 1 < self.max_retries:
+                    self.sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+                continue
+            self.written_rows += len(rows)
+            return True
+        return False
+
+    def _spool(self, rows):
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.spooled_rows += len(rows)
+
+    def _flush_spool(self):
+        """Send the spooled rows in batches and truncate the file once all are written."""
+        self._last_spool_attempt = time.monotonic()
+        with open(self.spool_path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for start in range(0, len(rows), self.batch_size):
+            if not self._send(rows[start:start + self.batch_size]):
+                # Keep only what is still unsent
+                self._rewrite_spool(rows[start:])
+                return
+        self._rewrite_spool([])
+
+    def _rewrite_spool(self, rows):
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+        os.replace(tmp_path, self.spool_path)
@@ -0,0 +1,108 @@
+"""Sound effects for the browser: compact encodings, a one-time installer and tiny play triggers.
+
+The WAV files that ship with the game are 44.1 kHz stereo 16-bit. Each one is
+transcoded once per process to Opus in Ogg when pydub and ffmpeg are available,
+or otherwise to 16 kHz mono 8-bit WAV. installer_html puts the sounds into the
+page once per session; after that, trigger_html plays them with a few hundred
+bytes and no audio data.
+"""
+import base64
+import io
+import json
+import wave
+import numpy as np
+
+SOUND_FILES = {
+    "move_green": "move_car2.wav",
+    "move_red": "move_car.wav",
+    "win": "game_win.wav",
+    "lose": "game_lose.wav",
+}
+WAV_RATE = 16_000  # Sample rate of the fallback encoding
+OPUS_BITRATE = "32k"
+ELEMENT_PREFIX = "mind-race-sound-"  # id of each <audio> element in the page
+
+
+def compact_wav(path, rate=WAV_RATE):
+    """Mono 8-bit PCM WAV bytes of a WAV file resampled to rate, with numpy and the wave module only."""
+    with wave.open(path) as source:
+        channels, width, source_rate = source.getnchannels(), source.getsampwidth(), source.getframerate()
+        raw = source.readframes(source.getnframes())
+    samples = np.frombuffer(raw, dtype={1: np.uint8, 2: "<i2", 4: "<i4"}[width]).reshape(-1, channels)
+    samples = samples.mean(axis=1)
+    if width == 1:
+        samples -= 128
+    samples /= 2.0 ** (8 * width - 1)
+    if rate < source_rate:
+        # Box filter over one output sample period against aliasing, then linear resampling
+        taps = int(np.ceil(source_rate / rate))
+        samples = np.convolve(samples, np.full(taps, 1 / taps), mode="same")
+        positions = np.arange(int(len(samples) * rate / source_rate)) * (source_rate / rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    else:
+        rate = source_rate
+    pcm = np.clip(np.round(samples * 127 + 128), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as target:
+        target.setnchannels(1)
+        target.setsampwidth(1)
+        target.setframerate(rate)
+        target.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def transcode(path):
+    """(mime type, bytes) of the most compact encoding available for a WAV file."""
+    try:
+        from pydub import AudioSegment
+
+        buffer = io.BytesIO()
+        AudioSegment.from_wav(path).set_channels(1).export(
+            buffer, format="ogg", codec="libopus", bitrate=OPUS_BITRATE
+        )
+        return "audio/ogg", buffer.getvalue()
+    except Exception:
+        # pydub missing, or no ffmpeg with Opus support to encode with
+        return "audio/wav", compact_wav(path)
+
+
+def data_url(mime, data):
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def installer_html(sources):
+    """Script adding one preloaded <audio> element per sound to the page, unless it is already there.
+
+    sources maps sound names to data URLs. The elements live in the Streamlit
+    page, not in the st.iframe that runs the script, so they outlive it and later triggers
+    can play them.
+    """
+    return f"""<script>
+    (function () {{
+        const doc = window.parent.document;
+        const sources = {json.dumps(sources)};
+        for (const [name, src] of Object.entries(sources)) {{
+            if (doc.getElementById("{ELEMENT_PREFIX}" + name)) continue;
+            const audio = doc.createElement("audio");
+            audio.id = "{ELEMENT_PREFIX}" + name;
+            audio.preload = "auto";
+            audio.src = src;
+            doc.body.appendChild(audio);
+        }}
+    }})();
+    </script>"""
+
+
+def trigger_html(names, sequence):
+    """Script playing the named sounds already installed in the page.
+
+    sequence makes every trigger's markup different, so the browser runs it again
+    even when the same sounds play on consecutive ticks.
+    """
+    return f"""<script>
+    // {sequence}
+    for (const name of {json.dumps(list(names))}) {{
+        const audio = window.parent.document.getElementById("{ELEMENT_PREFIX}" + name);
+        if (audio) {{ audio.currentTime = 0; audio.play().catch(() => {{}}); }}
+    }}
+    </script>"""
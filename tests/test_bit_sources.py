@@ -0,0 +1,30 @@
+import numpy as np
+from bit_sources import PackedBitPool
+
+
+class ManualPool(PackedBitPool):
+    """Pool filled by the test instead of a worker."""
+
+    def _fill(self):
+        pass
+
+    def put(self, data):
+        with self._lock:
+            self._put(np.asarray(data, dtype=np.uint8))
+
+
+def test_grow_keeps_unread_bytes_in_order_across_the_wrap():
+    pool = ManualPool(capacity=8 * 8)
+    pool.put(range(6))
+    assert pool.take_packed(8 * 4).tolist() == [0, 1, 2, 3]
+    pool.put(range(6, 12))  # Wraps around the end of the 8-byte ring
+    pool.grow(8 * 32)
+    pool.put(range(12, 20))
+    assert pool.capacity == 32
+    assert pool.take_packed(8 * 16).tolist() == list(range(4, 20))
+
+
+def test_grow_never_shrinks():
+    pool = ManualPool(capacity=8 * 16)
+    pool.grow(8 * 4)
+    assert pool.capacity == 16
@@ -0,0 +1,28 @@
+import pstats
+import threading
+from instrumentation import RaceProfiler
+
+
+def busy_tick():
+    return sum(range(1000))
+
+
+def test_race_profiler_merges_runs_on_different_threads(tmp_path):
+    profiler = RaceProfiler(str(tmp_path / "race.prof"))
+
+    def fragment_run():
+        with profiler.capture():
+            busy_tick()
+
+    for _ in range(3):
+        # Like Streamlit, every run is on a new thread
+        thread = threading.Thread(target=fragment_run)
+        thread.start()
+        thread.join()
+    with profiler.capture():
+        busy_tick()
+        path = profiler.stop()  # As end_race does, from inside the last run
+
+    calls = {name: stats[1] for (_, _, name), stats in pstats.Stats(path).stats.items()}
+    assert profiler.runs == 4
+    assert calls["busy_tick"] == 4
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from race_engine import (
+    LaneRace,
+    LevelPercentiles,
+    RunningPercentile,
+    entropy_table,
+    lane_targets,
+    simulate_null_races,
+    simulate_race,
+)
+
+
+@pytest.mark.parametrize("q", [5, 50, 95])
+def test_running_percentile_matches_numpy_after_each_insert(q):
+    rng = np.random.default_rng(0)
+    values = rng.choice(entropy_table(100), size=300)  # A few levels, so plenty of duplicates
+    tracker = RunningPercentile(q)
+    for i, value in enumerate(values):
+        tracker.add(value)
+        assert tracker.value() == np.percentile(values[:i + 1], q)
+
+
+def test_running_percentile_short_histories_and_duplicates():
+    for history in ([0.7], [0.7, 0.7], [0.9, 0.1], [0.5, 0.5, 0.2], [1.0, 0.0, 1.0, 0.0]):
+        tracker = RunningPercentile(5)
+        for i, value in enumerate(history):
+            tracker.add(value)
+            assert tracker.value() == np.percentile(history[:i + 1], 5)
+
+
+def test_running_percentile_of_empty_sample_raises():
+    with pytest.raises(ValueError):
+        RunningPercentile(5).value()
+
+
+def test_level_percentiles_match_numpy_for_every_race():
+    rng = np.random.default_rng(1)
+    levels = np.unique(entropy_table(50))
+    indexes = rng.integers(0, len(levels), size=(200, 3))
+    percentiles = LevelPercentiles(levels, 3, 5)
+    for i, tick in enumerate(indexes):
+        percentiles.add(tick)
+        expected = [np.percentile(levels[indexes[:i + 1, race]], 5) for race in range(3)]
+        np.testing.assert_array_equal(percentiles.value(), expected)
+
+
+def test_level_percentiles_match_numpy_after_dropping_races():
+    rng = np.random.default_rng(2)
+    levels = np.unique(entropy_table(1000))
+    indexes = rng.binomial(1000, 0.5, size=(400, 8)) // 2  # Clustered levels with gaps, as in a race
+    percentiles = LevelPercentiles(levels, 8, 5)
+    races = np.arange(8)
+    for i, tick in enumerate(indexes):
+        if i in (100, 200, 300):
+            mask = np.ones(len(races), dtype=bool)
+            mask[::3] = False  # Drops rows without compacting first, then compacts
+            races = races[mask]
+            percentiles.keep(mask)
+        percentiles.add(tick[races])
+        expected = [np.percentile(levels[indexes[:i + 1, race]], 5) for race in races]
+        np.testing.assert_array_equal(percentiles.value(), expected)
+
+
+@pytest.mark.parametrize("exact_threshold", [False, True])
+def test_null_races_follow_the_rules_of_simulate_race(exact_threshold):
+    slot_size, max_ticks = 100, 3000
+    ones = np.random.default_rng(7).binomial(slot_size, 0.5, size=(max_ticks, 2))
+    bits = (np.arange(slot_size) < ones[:, :, None]).astype(np.uint8)  # Green and red slots with those counts
+    race = simulate_race(bits[:, 0], bits[:, 1], 1, 100, exact_threshold)
+    null = simulate_null_races(1, 100, np.random.default_rng(7), slot_size, 1, exact_threshold, max_ticks=max_ticks)
+    assert null["finished"][0]
+    assert null["ticks"][0] == race["ticks"]
+    assert null["green_won"][0] == (race["winner"] == "green")
+    assert (null["car1_moves"][0], null["car2_moves"][0]) == (race["car1_moves"], race["car2_moves"])
+
+
+@pytest.mark.parametrize("exact_threshold", [False, True])
+def test_simulate_race_matches_lane_race_tick_by_tick(exact_threshold):
+    rng = np.random.default_rng(11)
+    bits = rng.integers(0, 2, size=(2, 2000, 100), dtype=np.uint8)
+    result = simulate_race(bits[0], bits[1], 0, 30, exact_threshold)
+
+    # LaneRace is the reference implementation of the movement rules
+    race = LaneRace(lane_targets(0, 2), 100, 30, exact_threshold)
+    for tick in range(result["ticks"]):
+        entropy, threshold, distance = race.tick(np.count_nonzero(bits[:, tick], axis=1))
+        assert (result["entropy_1"][tick], result["entropy_2"][tick]) == tuple(entropy)
+        assert (result["threshold_1"][tick], result["threshold_2"][tick]) == tuple(threshold)
+        assert (result["green_distance"][tick], result["red_distance"][tick]) == tuple(distance)
+        assert (result["car2_pos"][tick], result["car_pos"][tick]) == tuple(race.positions)
+    lane = race.winner()
+    assert result["winner"] == (None if lane is None else "green" if lane == 0 else "red")
+    assert (result["car2_moves"], result["car1_moves"]) == tuple(race.moves)
@@ -0,0 +1,21 @@
+import numpy as np
+from bit_sources import PackedBitLog
+from race_export import TickLog, iter_export_chunks
+
+
+def test_two_lane_columns_describe_the_same_car():
+    # Lane 0 (green) is all ones and far ahead, lane 1 (red) all zeros
+    lane_bits = [PackedBitLog(), PackedBitLog()]
+    tick_log = TickLog(2)
+    for tick in range(3):
+        lane_bits[0].append(np.ones(8, dtype=np.uint8))
+        lane_bits[1].append(np.zeros(8, dtype=np.uint8))
+        tick_log.append(distance=np.array([10.0, 0.0]), position=np.array([100.0 + tick, 50.0]))
+
+    df = next(iter_export_chunks(lane_bits, tick_log, player_choice=1))
+    assert (df["Green Car"] == "11111111").all()
+    assert (df["Red Car"] == "00000000").all()
+    assert (df["Green Car Bit Chosen"] == 1).all() and (df["Red Car Bit Chosen"] == 0).all()
+    assert (df["Green Move"] == 10.0).all() and (df["Red Move"] == 0.0).all()
+    assert df["Green Car Position"].tolist() == [100.0, 101.0, 102.0]
+    assert (df["Red Car Position"] == 50.0).all()
@@ -0,0 +1,25 @@
+import numpy as np
+from race_engine import simulate_race
+from race_host import RaceState
+from results_store import FIELD_NAMES
+
+
+def test_hosted_race_follows_the_game_rules_and_columns():
+    rng = np.random.default_rng(7)
+    bits = rng.integers(0, 2, size=(2, 400, 1000), dtype=np.uint8)
+    expected = simulate_race(bits[0], bits[1], player_choice=1, move_multiplier=200)
+
+    state = RaceState(1, player_choice=1, move_multiplier=200)
+    state.started_at = 0.0
+    for tick in range(expected["ticks"]):
+        state.tick(np.packbits(bits[:, tick], axis=1))
+    state.finished_at = 10.0
+
+    row = dict(zip(FIELD_NAMES, state.result_row()))
+    assert len(row) == len(FIELD_NAMES)
+    assert row["green_position"] == expected["car2_pos"][-1]
+    assert row["red_position"] == expected["car_pos"][-1]
+    assert (row["green_moves"], row["red_moves"]) == (expected["car2_moves"], expected["car1_moves"])
+    assert row["winner"] == "Red" and expected["winner"] == "red"
+    assert row["green_ones"] == bits[0, :expected["ticks"]].sum(dtype=np.int64)
+    assert row["green_speed"] == row["green_position"] / 10.0
@@ -0,0 +1,33 @@
+import numpy as np
+from race_engine import LaneRace, lane_targets
+from race_recording import RaceRecorder, RaceRecording, replay
+
+
+def test_replay_follows_settings_changed_during_the_race(tmp_path):
+    rng = np.random.default_rng(3)
+    path = str(tmp_path / "race.bin")
+    recorder = RaceRecorder(path, 1000, tick_interval=0.5, move_multiplier=20, player_choice=1)
+    race = LaneRace(lane_targets(1, 2), 1000, move_multiplier=20)
+    for tick in range(300):
+        if tick == 50:
+            race.move_multiplier = 60  # Slider moved while running
+        if tick == 100:
+            race.exact_threshold = True
+        if tick == 150:
+            # Stopped and resumed with the other bit: the same recording goes on
+            recorder.resume(0.5)
+            race.target_bits = lane_targets(0, 2)
+        bits = rng.integers(0, 2, size=(2, 1000), dtype=np.uint8)
+        recorder.append(bits, elapsed=(tick % 150) * 0.5, move_multiplier=race.move_multiplier,
+                        exact_threshold=race.exact_threshold, player_choice=int(race.target_bits[0]))
+        race.tick(np.count_nonzero(bits, axis=1))
+        if race.winner() is not None:
+            break
+    recorder.close()
+
+    with RaceRecording(path) as recording:
+        assert (np.diff(recording.records["time"]) > 0).all()
+        replayed = replay(recording)
+    assert replayed.ticks == race.ticks
+    np.testing.assert_array_equal(replayed.positions, race.positions)
+    np.testing.assert_array_equal(replayed.moves, race.moves)
@@ -0,0 +1,60 @@
+import sqlite3
+from results_store import FIELD_NAMES, ResultsStore
+
+
+def make_row(email, total_time):
+    values = dict.fromkeys(FIELD_NAMES, 0)
+    values.update(language="English", winner="Green", email=email, total_time=total_time, move_multiplier=50.0)
+    return [values[name] for name in FIELD_NAMES]
+
+
+def unsynced(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM results WHERE synced = 0").fetchone()[0]
+
+
+def test_rows_stay_unsynced_until_sync_confirms_them(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    forwarded = []
+    store = ResultsStore(path, sync=lambda row, done: forwarded.append((row, done)), linger=0)
+    store.submit(make_row("a@example.com", 30.0), "green")
+    store.submit(make_row("b@example.com", 40.0), "green")
+    store.flush()
+    store.close()
+    assert len(forwarded) == 2
+    assert unsynced(path) == 2  # Handed over, but nothing confirmed the write
+
+    # After a restart the unconfirmed rows are forwarded again; confirmed ones are marked
+    resent = []
+    store = ResultsStore(path, sync=lambda row, done: (resent.append(row), done()), linger=0)
+    store.close()
+    assert [row[FIELD_NAMES.index("email")] for row in resent] == ["a@example.com", "b@example.com"]
+    assert unsynced(path) == 0
+    assert store.synced_rows == 2
+
+
+def test_refused_batch_is_retried_then_spooled_and_inserted_first(tmp_path, monkeypatch):
+    path = str(tmp_path / "results.sqlite3")
+    sleeps = []
+    store = ResultsStore(path, linger=0, max_retries=2, backoff=0.5, sleep=sleeps.append)
+    insert = store._insert
+    attempts = []
+
+    def failing_insert(conn, sql, rows):
+        attempts.append(len(rows))
+        if len(attempts) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        insert(conn, sql, rows)
+
+    monkeypatch.setattr(store, "_insert", failing_insert)
+    store.submit(make_row("a@example.com", 30.0), "green")
+    store.flush()
+    assert sleeps == [0.5]
+    assert store.pending_spool and store.spooled_rows == 1 and store.count() == 0
+
+    store.submit(make_row("b@example.com", 40.0), "green")
+    store.flush()
+    store.close()
+    assert attempts == [1, 1, 2]  # The spooled row goes in with the next batch
+    assert not store.pending_spool
+    assert [r["email"] for r in store.leaderboard()] == ["a@example.com", "b@example.com"]
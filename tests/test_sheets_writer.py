@@ -0,0 +1,62 @@
+from fakes import FakeWorksheet
+from sheets_writer import SheetsWriter
+
+
+def make_writer(tmp_path, worksheet, sleeps, **kwargs):
+    kwargs.setdefault("linger", 0.05)
+    return SheetsWriter(lambda: worksheet, str(tmp_path / "spool.jsonl"), sleep=sleeps.append, **kwargs)
+
+
+def test_rows_submitted_together_are_sent_in_batches(tmp_path):
+    worksheet = FakeWorksheet()
+    writer = make_writer(tmp_path, worksheet, [], batch_size=3, linger=0.5)
+    for i in range(5):
+        writer.submit([i, "green"])
+    writer.close()
+    assert worksheet.calls == 2  # 3 + 2 rows
+    assert worksheet.rows == [[i, "green"] for i in range(5)]
+    assert writer.written_rows == 5
+
+
+def test_failed_append_is_retried_with_capped_exponential_backoff(tmp_path):
+    worksheet = FakeWorksheet(fail_times=3)
+    sleeps = []
+    writer = make_writer(tmp_path, worksheet, sleeps, max_retries=4, backoff=1.0, max_backoff=3.0)
+    writer.submit([1, "red"])
+    writer.close()
+    assert sleeps == [1.0, 2.0, 3.0]
+    assert worksheet.rows == [[1, "red"]]
+    assert writer.failures == 3 and not writer.pending_spool
+
+
+def test_rows_are_spooled_while_the_worksheet_is_offline(tmp_path):
+    worksheet = FakeWorksheet()
+    worksheet.offline = True
+    sleeps, done = [], []
+    writer = make_writer(tmp_path, worksheet, sleeps, max_retries=2, backoff=0.5)
+    writer.submit([1, "red"], done=lambda: done.append(1))
+    writer.flush()
+    writer.submit([2, "green"], done=lambda: done.append(2))
+    writer.close()
+    assert sleeps == [0.5, 0.5]  # The first batch, then the spool replay tried before the second
+    assert done == [1, 2]  # Spooled rows are handed over as well
+    assert worksheet.rows == [] and writer.spooled_rows == 2
+    with open(writer.spool_path, encoding="utf-8") as f:
+        assert f.read().splitlines() == ['[1, "red"]', '[2, "green"]']
+
+
+def test_spooled_rows_are_replayed_first_once_the_worksheet_is_back(tmp_path):
+    worksheet = FakeWorksheet()
+    worksheet.offline = True
+    writer = make_writer(tmp_path, worksheet, [], max_retries=1)
+    writer.submit([1, "red"])
+    writer.submit([2, "red"])
+    writer.flush()
+    assert writer.pending_spool
+
+    worksheet.offline = False
+    writer.submit([3, "green"])
+    writer.close()
+    assert worksheet.rows == [[1, "red"], [2, "red"], [3, "green"]]
+    assert not writer.pending_spool
+    assert writer.written_rows == 3
@@ -0,0 +1,59 @@
+import pytest
+from tick_scheduler import TickScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(policy, **kwargs):
+    clock = FakeClock()
+    return TickScheduler(1.0, policy, clock=clock, **kwargs), clock
+
+
+def test_skip_drops_missed_deadlines_and_stays_on_the_grid():
+    scheduler, clock = make_scheduler(TickScheduler.SKIP)
+    assert scheduler.poll() == 1  # The first poll starts the schedule
+    clock.now = 0.4
+    assert scheduler.poll() == 0  # More than half an interval early
+    clock.now = 0.6
+    assert scheduler.poll() == 1  # Early timer wake-up still runs tick 1
+    assert scheduler.last_lateness == 0.0
+
+    clock.now = 4.3  # Deadlines 2 and 3 missed
+    assert scheduler.poll() == 1
+    assert scheduler.skipped_ticks == 2 and scheduler.overruns == 1
+    assert scheduler.last_lateness == pytest.approx(0.3)  # Late for deadline 4, not 2
+    assert scheduler.next_deadline == 5.0
+    clock.now = 5.0
+    assert scheduler.poll(early=0) == 1
+    assert scheduler.stats() == {
+        "ticks": 4, "overruns": 1, "skipped_ticks": 2,
+        "jitter_mean": pytest.approx(0.3 / 4), "jitter_max": pytest.approx(0.3),
+    }
+
+
+def test_catch_up_runs_late_ticks_back_to_back_up_to_the_allowance():
+    scheduler, clock = make_scheduler(TickScheduler.CATCH_UP, max_catch_up=2)
+    assert scheduler.poll() == 1
+    clock.now = 3.5  # Deadlines 1, 2 and 3 are due
+    assert scheduler.poll() == 3
+    assert (scheduler.ticks, scheduler.overruns, scheduler.skipped_ticks) == (4, 2, 0)
+    assert scheduler.jitter_max == pytest.approx(2.5)
+    assert scheduler.next_deadline == 4.0
+
+    clock.now = 10.2  # Six intervals behind: only the last two are caught up
+    assert scheduler.poll() == 3
+    assert (scheduler.ticks, scheduler.overruns, scheduler.skipped_ticks) == (7, 4, 4)
+    assert scheduler.last_lateness == pytest.approx(0.2)
+    assert scheduler.next_deadline == 11.0
+    assert scheduler.poll(early=0) == 0
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        TickScheduler(1.0, "drop")
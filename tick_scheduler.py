@@ -0,0 +1,93 @@
+import math
+import time
+
+
+class TickScheduler:
+    """Run ticks at a fixed rate against absolute deadlines on a monotonic clock.
+
+    Tick k is due at start + k × interval, so a slow tick does not shift the ones
+    after it. When a tick starts late by a full interval or more, the policy decides
+    what happens to the deadlines that were missed:
+
+    - "skip": drop them and continue on the next deadline of the grid.
+    - "catch-up": run the late ticks back to back until the schedule is met again,
+      skipping only beyond max_catch_up ticks behind.
+    """
+
+    SKIP = "skip"
+    CATCH_UP = "catch-up"
+
+    def __init__(self, interval, policy=SKIP, max_catch_up=10, clock=time.monotonic):
+        if policy not in (self.SKIP, self.CATCH_UP):
+            raise ValueError(f"unknown overrun policy: {policy}")
+        self.interval = interval
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.start_time = None
+        self.next_deadline = None
+        self.ticks = 0
+        self.overruns = 0  # Ticks that started a full interval or more after their deadline
+        self.skipped_ticks = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        self.last_lateness = 0.0
+
+    def poll(self, early=None):
+        """Account for the ticks due now and return how many to run, without blocking.
+
+        For callers woken by an outside timer, e.g. a Streamlit fragment with
+        run_every. A wake-up up to early seconds (half an interval by default)
+        before the deadline still runs the tick, so timer jitter neither drops
+        nor doubles ticks; under the catch-up policy several ticks may be due.
+        """
+        now = self.clock()
+        if self.start_time is None:
+            self.start_time = self.next_deadline = now
+        elif now < self.next_deadline - (self.interval / 2 if early is None else early):
+            return 0
+        due = 0
+        while True:
+            self._account(now)
+            due += 1
+            if self.policy == self.SKIP or now < self.next_deadline:
+                return due
+
+    def _account(self, now):
+        """Record the start of the next tick at now and move on to the following deadline."""
+        lateness = max(now - self.next_deadline, 0.0)
+        behind = math.floor(lateness / self.interval)
+        if behind:
+            self.overruns += 1
+            allowed = 0 if self.policy == self.SKIP else self.max_catch_up
+            if behind > allowed:
+                # Jump to the latest missed deadline that is still inside the allowance
+                skipped = behind - allowed
+                self.skipped_ticks += skipped
+                self.next_deadline += skipped * self.interval
+                lateness -= skipped * self.interval
+
+        self.ticks += 1
+        self.last_lateness = lateness
+        self.jitter_total += lateness
+        self.jitter_max = max(self.jitter_max, lateness)
+        self.next_deadline += self.interval
+
+    @property
+    def jitter_mean(self):
+        """Average delay between a tick's deadline and its actual start, in seconds."""
+        return self.jitter_total / self.ticks if self.ticks else 0.0
+
+    def elapsed(self):
+        """Seconds since the first tick."""
+        return self.clock() - self.start_time if self.start_time is not None else 0.0
+
+    def stats(self):
+        """Timing counters to store next to the race data."""
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped_ticks": self.skipped_ticks,
+            "jitter_mean": self.jitter_mean,
+            "jitter_max": self.jitter_max,
+        }